@@ -1,10 +1,26 @@
 # Author: Lintao
 import argparse
-import fnmatch
+import hashlib
 import json
 import logging
 import os
-from llm_api import get_model_answer
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from checkpoint import DescriptionCheckpoint, iter_json_object
+from chunking import estimate_tokens, split_into_chunks
+from description_cache import DescriptionCache
+from file_inventory import FileInventory, file_digest
+from gitignore import GitignoreMatcher
+from project_structure import atomic_write, iter_structure_lines, write_structure
+from pipeline import StageGraph
+from profiler import Profiler, get_profiler, set_profiler
+from prompt_compaction import (collapse_structure, format_entries, group_by_directory, group_by_top_level,
+                               truncate_to_tokens)
+from llm_api import MISSING_CONFIG_ANSWER, get_client, is_error_answer, iter_stream_content
+from requirements_resolver import find_imported_modules, find_local_modules, is_stdlib_module, resolve_requirements
 
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -15,7 +31,11 @@ class AutoReadme:
     """
 
     def __init__(self, project_name, project_dir, author, model_name=None,
-                 out_put_dir=None, readme_path=None, project_description=None, config_dir=None, language="en"):
+                 out_put_dir=None, readme_path=None, project_description=None, config_dir=None, language="en",
+                 max_concurrency=1, use_cache=True, cache_dir=None, cache_max_mb=256, max_chunk_tokens=6000,
+                 readme_token_budget=12000, structure_depth=3, cache=None, structure_max_depth=None,
+                 structure_max_entries=None, structure_collapse_threshold=None, pack_small_files=True,
+                 small_file_tokens=500, pack_token_budget=4000, resume=False):
         self.project_name = project_name
         self.project_dir = project_dir
         self.project_description = project_description
@@ -37,116 +57,386 @@ class AutoReadme:
         self.model = model_name
         self.out_put_dir = out_put_dir
         self.readme_path = readme_path
+        self.max_concurrency = max(1, int(max_concurrency or 1))
+        self.max_chunk_tokens = max_chunk_tokens
+        self.readme_token_budget = readme_token_budget
+        self.structure_depth = structure_depth
+        self.structure_max_depth = structure_max_depth
+        self.structure_max_entries = structure_max_entries
+        self.structure_collapse_threshold = structure_collapse_threshold
+        self.pack_small_files = pack_small_files
+        self.small_file_tokens = small_file_tokens
+        self.pack_token_budget = pack_token_budget
+        self.resume = resume
+        self.checkpoint_path = os.path.join(out_put_dir, "SCRIPT_DESCRIPTION.jsonl")
+        self.description_failures = {}
+        self._inventory = None
+        self._ignore_matcher = None
+        self._inventory_lock = threading.Lock()
+        # one client for the whole run: the config is parsed once and the client is shared by every request
+        self.llm_client = get_client(model_name, config_dir)
+        self.cache = cache
+        if use_cache and cache is None:
+            if not cache_dir:
+                cache_dir = os.path.join(config_dir, "cache")
+            self.cache = DescriptionCache(cache_dir, max_bytes=int(cache_max_mb * 1024 * 1024))
         logging.info(
             f"AutoReadme initialized for {project_name}, project directory: {project_dir}, Author: {author}, Config directory: {config_dir}, Model: {model_name}")
 
-    def generate_dependency(self):
-        project_structure = self.generate_project_structure(self.project_dir)
-        logging.info(f'Project structure:')
-        logging.info("\n".join(project_structure))
-        save_content_to_file("\n".join(project_structure), os.path.join(self.out_put_dir, "PROJECT_STRUCTURE.md"))
+    def ask_model(self, prompt, stream=False):
+        if self.llm_client is None:
+            self.llm_client = get_client(self.model, self.config_dir)
+            if self.llm_client is None:
+                return MISSING_CONFIG_ANSWER
+        return self.llm_client.get_response(prompt, stream=stream)
+
+    def build_pipeline(self, stream=False):
+        """
+        The stage graph of a full run. Structure, requirements and descriptions only share the file inventory, so they
+        run concurrently; the README prompt is assembled once all three are on disk, then the README is requested.
+        """
+        graph = StageGraph()
+        graph.add("structure", lambda results, stop: self.save_project_structure())
+        graph.add("requirements",
+                  lambda results, stop: self.save_project_requirements(self.generate_project_requirements()))
+        graph.add("descriptions", lambda results, stop: self.save_all_script_descriptions(stop=stop))
+        graph.add("readme_prompt", lambda results, stop: self.build_readme_prompt(),
+                  deps=("structure", "requirements", "descriptions"))
+        # run on its own, the readme stage assembles the prompt from the files on disk
+        graph.add("readme", lambda results, stop: self.request_readme(
+            results["readme_prompt"] if "readme_prompt" in results else self.build_readme_prompt(), stream=stream),
+            deps=("readme_prompt",))
+        return graph
+
+    def run_pipeline(self, stages=None, stream=False, downstream=False):
+        """
+        Run the stages of build_pipeline (default: all). Stages left out are not re-run and their outputs on disk are
+        used, e.g. ["descriptions", "readme_prompt", "readme"] refreshes the descriptions and the README only.
+        :param downstream: also run every stage that depends on the given ones, e.g. ["descriptions"] then
+            regenerates the README as well.
+        """
+        graph = self.build_pipeline(stream=stream)
+        if stages and downstream:
+            stages = graph.dependents(stages)
+        return graph.run(stages)
 
-        requirements = self.generate_project_requirements()
+    def generate_dependency(self):
+        self.run_pipeline(["structure", "requirements", "descriptions"])
+
+    def save_all_script_descriptions(self, stop=None):
+        # every description goes to the checkpoint as soon as it is done, so an interrupted run can be resumed
+        checkpoint = self.open_checkpoint(resume=self.resume)
+        try:
+            scripts = self.generate_description_of_all_scripts(checkpoint=checkpoint, stop=stop)
+            self.save_script_descriptions(checkpoint=checkpoint, order=scripts)
+        finally:
+            checkpoint.close()
+
+    def save_project_structure(self):
+        # streamed line by line, the whole listing is never held or logged as one string
+        structure_path = os.path.join(self.out_put_dir, "PROJECT_STRUCTURE.md")
+        count = write_structure(self.iter_project_structure(self.project_dir), structure_path)
+        logging.info(f"Project structure ({count} lines) has been saved to {structure_path}")
+
+    def save_project_requirements(self, requirements):
         logging.info(f'Project requirements:')
         logging.info("\n".join(requirements))
         save_content_to_file("\n".join(requirements), os.path.join(self.out_put_dir, "requirements.txt"))
 
-        scripts_description = self.generate_description_of_all_scripts()
-        logging.info(f'Scripts description:')
-        logging.info(scripts_description)
-        with open(os.path.join(self.out_put_dir, "SCRIPT_DESCRIPTION.json"), "w", encoding='utf-8') as f:
-            json.dump(scripts_description, f, ensure_ascii=False, indent=4)
-
-    def load_ignore_files(self):
-        logging.info("Loading ignore files")
-        ignore_files = []
-        gitignore_path = os.path.join(self.project_dir, ".gitignore")
-        if os.path.exists(gitignore_path):
-            with open(gitignore_path, "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        ignore_files.append(line)
-        logging.debug(ignore_files)
-        return ignore_files
-
-    def is_ignored(self, filepath, ignore_files):
-        relative_path = os.path.relpath(filepath, self.project_dir)  # get the relative path of the file
-        for pattern in ignore_files:
-            if fnmatch.fnmatch(relative_path, pattern):
-                logging.debug(f"Ignored: {relative_path}")
-                return True
-        logging.debug(f"Not ignored: {relative_path}")
-        return False
+    def save_script_descriptions(self, scripts_description=None, checkpoint=None, order=None):
+        """
+        Write SCRIPT_DESCRIPTION.json from a dict, or from a checkpoint one entry at a time in the given order.
+        """
+        description_path = os.path.join(self.out_put_dir, "SCRIPT_DESCRIPTION.json")
+        if checkpoint is not None:
+            count = checkpoint.compact_to_json(description_path, order)
+            logging.info(f"{count} script descriptions have been saved to {description_path}")
+        else:
+            with open(description_path, "w", encoding='utf-8') as f:
+                json.dump(scripts_description, f, ensure_ascii=False, indent=4)
+        failures_path = os.path.join(self.out_put_dir, "DESCRIPTION_FAILURES.json")
+        if self.description_failures:
+            with open(failures_path, "w", encoding='utf-8') as f:
+                json.dump(self.description_failures, f, ensure_ascii=False, indent=4)
+            logging.warning(f"{len(self.description_failures)} scripts failed, see {failures_path}")
+        elif os.path.exists(failures_path):
+            os.remove(failures_path)
+
+    def load_script_descriptions(self):
+        return OrderedDict(self.iter_script_descriptions())
+
+    def iter_script_descriptions(self):
+        """
+        Yield (path, description) from SCRIPT_DESCRIPTION.json one entry at a time, or from the checkpoint of an
+        interrupted run when the JSON was never written.
+        """
+        path = os.path.join(self.out_put_dir, "SCRIPT_DESCRIPTION.json")
+        if os.path.exists(path):
+            yield from iter_json_object(path)
+        elif os.path.exists(self.checkpoint_path):
+            checkpoint = self.open_checkpoint(resume=True)
+            try:
+                yield from checkpoint.iter_descriptions()
+            finally:
+                checkpoint.close()
+
+    def open_checkpoint(self, resume=False):
+        # descriptions made by another model or in another language do not count as done
+        return DescriptionCheckpoint(self.checkpoint_path, resume=resume, model=self.model, language=self.language)
+
+    def record_descriptions(self, descriptions):
+        """Append descriptions made outside a full run (e.g. by the watcher) to the checkpoint."""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        inventory = self.get_inventory()
+        checkpoint = self.open_checkpoint(resume=True)
+        try:
+            for path, description in descriptions.items():
+                checkpoint.append(path, description, inventory.stat(path))
+        finally:
+            checkpoint.close()
+
+    def get_ignore_matcher(self, refresh=False):
+        if self._ignore_matcher is None or refresh:
+            logging.info("Loading ignore files")
+            self._ignore_matcher = GitignoreMatcher(self.project_dir)
+        return self._ignore_matcher
+
+    def is_ignored(self, filepath, *, is_dir=None):
+        # is_dir is keyword-only so calls with the old ignore_files list fail loudly instead of being misread
+        ignored = self.get_ignore_matcher().is_ignored(filepath, is_dir)
+        logging.debug(f"{'Ignored' if ignored else 'Not ignored'}: {filepath}")
+        return ignored
+
+    def get_inventory(self, refresh=False):
+        """Scan the project once and share the result between the structure, requirements and description stages."""
+        with self._inventory_lock:
+            if self._inventory is None or refresh:
+                profiler = get_profiler()
+                with profiler.stage("inventory"):
+                    self._inventory = FileInventory(self.project_dir, self.get_ignore_matcher(refresh).is_ignored)
+                profiler.count("is_ignored_calls", self._inventory.ignore_checks)
+                profiler.count("is_ignored_seconds", self._inventory.ignore_seconds)
+            return self._inventory
 
     def find_all_scripts_and_config_files(self):
         logging.info(f"Finding all scripts in {self.project_dir}")
-        ignore_files = self.load_ignore_files()
+        inventory = self.get_inventory()
         scripts = []
-        for root, dirs, files in os.walk(self.project_dir):
-            for file in files:
-                filepath = os.path.join(root, file)
-                if not self.is_ignored(filepath, ignore_files):
-                    if ((file.endswith(".py") or file.endswith(".sh") or file.endswith(".bash") or
-                         (file.endswith(".json") and "config" in root.lower()))
-                            and os.path.isfile(filepath)):
-                        scripts.append(filepath)
+        for filepath in inventory.files:
+            file = os.path.basename(filepath)
+            if (file.endswith(".py") or file.endswith(".sh") or file.endswith(".bash") or
+                    (file.endswith(".json") and "config" in os.path.dirname(filepath).lower())):
+                scripts.append(filepath)
         logging.info(f"Found {len(scripts)} scripts")
         for script in scripts:
             logging.debug(script)
         return scripts
 
-    def generate_description_of_all_scripts(self):
-        logging.info("Generating description of all scripts")
+    def generate_description_of_all_scripts(self, checkpoint=None, stop=None):
+        """
+        :param checkpoint: DescriptionCheckpoint that receives every description as soon as it is done. Scripts it
+            already holds for an unchanged file are skipped, and no descriptions are kept in memory.
+        :param stop: threading.Event; once it is set no further requests are started and KeyboardInterrupt is raised.
+        :return: {path: description} in inventory order, or with a checkpoint the list of scripts in inventory order.
+        """
+        logging.info(f"Generating description of all scripts, max concurrency: {self.max_concurrency}")
         scripts = self.find_all_scripts_and_config_files()
-        script_description = {}
+        self.description_failures = {}
+        pending = scripts
+        if checkpoint is not None:
+            inventory = self.get_inventory()
+            pending = [script for script in scripts if not checkpoint.is_done(script, inventory.stat(script))]
+            if len(pending) < len(scripts):
+                logging.info(f"{len(scripts) - len(pending)} scripts are already in {checkpoint.path}")
+        known, aliases, batches, singles = self._plan_descriptions(pending)
+        logging.info(f"{len(known)} scripts need no request, {len(aliases)} are duplicates, "
+                     f"{sum(len(batch) for batch in batches)} are packed into {len(batches)} requests, "
+                     f"{len(singles)} are described one by one")
+        duplicates = {}
+        for script, original in aliases.items():
+            duplicates.setdefault(original, []).append(script)
+        results = {}
+
+        def record(done):
+            # runs in the worker thread, so each description reaches the checkpoint as soon as it is done
+            for script, (description, error) in done.items():
+                for path in [script] + duplicates.get(script, []):
+                    if error is not None:
+                        self.description_failures[path] = error
+                    elif checkpoint is not None:
+                        checkpoint.append(path, description, inventory.stat(path))
+                    else:
+                        results[path] = description
+
+        record({script: (description, None) for script, description in known.items()})
+        tasks = [(self._describe_batch, batch) for batch in batches] + \
+                [(lambda script: {script: self._describe_script(script)}, script) for script in singles]
+        if stop is None:
+            stop = threading.Event()
+
+        def run_task(task):
+            if not stop.is_set():
+                record(task[0](task[1]))
+
+        if self.max_concurrency > 1 and len(tasks) > 1:
+            executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            try:
+                futures = [executor.submit(run_task, task) for task in tasks]
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # e.g. Ctrl-C: drop the queued requests instead of sending them all before exiting
+                stop.set()
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            executor.shutdown()
+        else:
+            for task in tasks:
+                run_task(task)
+        if stop.is_set():
+            logging.warning(f"Description run stopped, the finished descriptions are kept"
+                            f"{f' in {checkpoint.path}' if checkpoint is not None else ''}")
+            raise KeyboardInterrupt
+
+        if self.description_failures:
+            logging.warning(f"Failed to describe {len(self.description_failures)} of {len(pending)} scripts")
+        if checkpoint is not None:
+            return scripts
+        # results are put back in inventory order so SCRIPT_DESCRIPTION.json stays stable
+        return {script: results[script] for script in scripts if script in results}
+
+    def _plan_descriptions(self, scripts):
+        """
+        Sort scripts into those that need no request (empty, or cached), duplicates of another script's content, small
+        files packed into shared requests, and files described one by one.
+        :return: (known {path: description}, aliases {duplicate path: described path}, batches, singles)
+        """
+        inventory = self.get_inventory()
+        known, aliases, by_digest, small, singles = {}, {}, {}, [], []
         for script in scripts:
-            description = self.generate_file_description(script)
-            script_description[script] = description
-            brief_start = str(description)[:20].replace('\n', '')
-            brief_end = str(description)[-20:].replace('\n', '')
-            logging.info(f"Description of {script}: {brief_start}...{brief_end}")
-        return script_description
-
-    def generate_project_structure(self, dir_path, indent_level=0, ignore_files=None):
-        if ignore_files is None:
-            ignore_files = self.load_ignore_files()
-
-        markdown_lines = []
-        for item in sorted(os.listdir(dir_path)):
-            item_path = os.path.join(dir_path, item)
-            # Skip ignored files and directories
-            if self.is_ignored(item_path, ignore_files):
+            stat = inventory.stat(script)
+            if stat is None or stat.st_size > self.small_file_tokens * 4:
+                # large files are hashed block by block so identical copies (e.g. vendored ones) are described once
+                digest = file_digest(script)
+                if digest is not None:
+                    self._count_bytes_read(script)
+                    if digest in by_digest:
+                        aliases[script] = by_digest[digest]
+                        continue
+                    by_digest[digest] = script
+                singles.append(script)
                 continue
-
-            if os.path.isdir(item_path):
-                markdown_lines.append(f"{'  ' * indent_level}- **{item}/**")
-                markdown_lines.extend(self.generate_project_structure(item_path, indent_level + 1, ignore_files))
+            try:
+                with open(script, "r") as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError):
+                singles.append(script)  # reported as a failure by the single-file path
+                continue
+            self._count_bytes_read(script)
+            if not content.strip():
+                known[script] = "空文件。" if self.language == "cn" else "Empty file."
+                continue
+            digest = hashlib.sha1(content.encode('utf-8', errors='surrogatepass')).hexdigest()
+            if digest in by_digest:
+                aliases[script] = by_digest[digest]
+                continue
+            by_digest[digest] = script
+            if self.cache is not None:
+                cached = self.cache.get(self._description_cache_key(content))
+                if cached is None and self.pack_small_files:
+                    cached = self.cache.get(self._description_cache_key(content, self._batch_instruction()))
+                if cached is not None:
+                    known[script] = cached
+                    continue
+            if self.pack_small_files:
+                small.append((script, content))
             else:
-                markdown_lines.append(f"{'  ' * indent_level}- {item}")
-        return markdown_lines
+                singles.append(script)
+
+        batches, current, current_tokens = [], [], 0
+        for script, content in small:
+            tokens = estimate_tokens(content) + 20  # file header and answer overhead
+            if current and (current_tokens + tokens > self.pack_token_budget or len(current) >= 20):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append((script, content))
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        singles += [batch[0][0] for batch in batches if len(batch) == 1]
+        batches = [batch for batch in batches if len(batch) > 1]
+        return known, aliases, batches, singles
+
+    def _describe_batch(self, batch):
+        """Describe several small files in one request; files missing from the answer fall back to single requests."""
+        names = OrderedDict((os.path.relpath(script, self.project_dir).replace(os.sep, "/"), (script, content))
+                            for script, content in batch)
+        sys_instruction = self._batch_instruction()
+        query = "\n\n".join(f"### File: {name}\n```\n{content}\n```" for name, (_, content) in names.items())
+        prompt = [{"role": "system", "content": sys_instruction}, {"role": "user", "content": query}]
+        with get_profiler().stage("describe_batch", files=len(batch)):
+            answer = self.ask_model(prompt)
+        parsed = parse_json_answer(answer)
+        results, retry = {}, []
+        for name, (script, content) in names.items():
+            description = parsed.get(name) if isinstance(parsed, dict) else None
+            if not isinstance(description, str) or not description.strip():
+                retry.append(script)
+                continue
+            description = description.strip()
+            results[script] = (description, None)
+            if self.cache is not None:
+                # keyed on the packed instruction, the prompt that actually produced this description
+                self.cache.put(self._description_cache_key(content, sys_instruction), description)
+        if retry:
+            logging.warning(f"Packed answer did not cover {len(retry)} of {len(batch)} files, describing them one by one")
+            for script in retry:
+                results[script] = self._describe_script(script)
+        return results
+
+    def _describe_script(self, script):
+        """Return (description, error) so one broken file does not stop the whole run."""
+        try:
+            with get_profiler().stage("describe", path=script):
+                description = self.generate_file_description(script)
+        except Exception as e:
+            logging.error(f"Error generating description of {script}: {e}")
+            return None, f"{type(e).__name__}: {e}"
+        if is_error_answer(description):
+            logging.error(f"Error generating description of {script}: {description}")
+            return None, description
+        brief_start = str(description)[:20].replace('\n', '')
+        brief_end = str(description)[-20:].replace('\n', '')
+        logging.info(f"Description of {script}: {brief_start}...{brief_end}")
+        return description, None
+
+    def iter_project_structure(self, dir_path, indent_level=0):
+        return iter_structure_lines(dir_path, self.get_inventory().listdir, max_depth=self.structure_max_depth,
+                                    max_entries=self.structure_max_entries,
+                                    collapse_threshold=self.structure_collapse_threshold, indent_level=indent_level)
+
+    def generate_project_structure(self, dir_path, indent_level=0):
+        return list(self.iter_project_structure(dir_path, indent_level))
+
+    def find_imports(self, content, filename="<unknown>"):
+        return find_imported_modules(content, filename)
+
+    def find_third_party_modules(self):
+        scripts = self.find_all_scripts_and_config_files()
+        imported_modules = set()
+        for script in scripts:
+            if not script.endswith(".py"):
+                continue
+            logging.debug(f"Reading script: {script}")
+            with open(script, "r", encoding='utf-8', errors='replace') as f:
+                content = f.read()
+            self._count_bytes_read(script)
+            imported_modules.update(self.find_imports(content, script))
+        local_modules = find_local_modules(self.project_dir, scripts)
+        return {name for name in imported_modules if name not in local_modules and not is_stdlib_module(name)}
 
-    def generate_environment_requirements(self):
-        logging.info("Generating environment requirements")
-        logging.warning("Please ensure that the environment requirements are accurate and up-to-date!")
-        os.system(f"pip freeze > {os.path.join(self.out_put_dir, 'requirements_env.txt')}")
-        logging.info(
-            f"Environment requirements have been saved to {os.path.join(self.out_put_dir, 'requirements_env.txt')}")
-        requirements_env = []
-        with open(os.path.join(self.out_put_dir, 'requirements_env.txt'), 'r') as f:
-            for line in f:
-                requirements_env.append(line.strip())
-        logging.debug(requirements_env)
-        return requirements_env
-
-    def find_imports(self, content):
-        import_code_lines = []
-        for line in content.split("\n"):
-            if line.startswith("import") or line.startswith("from"):
-                import_code_lines.append(line)
-        return import_code_lines
-
-    def generate_project_requirements(self):
+    def generate_project_requirements(self, third_party=None):
         def parse_requirements_output(output):
             logging.debug("Parsing requirements output")
             try:
@@ -161,39 +451,96 @@ class AutoReadme:
             logging.debug(output_list)
             return output_list
 
-        environment_requirements = self.generate_environment_requirements()
-        environment_requirements_str = "\n".join(environment_requirements)
         logging.info("Generating project requirements")
-        scripts = self.find_all_scripts_and_config_files()
-        import_code_lines = []
-        for script in scripts:
-            logging.debug(f"Reading script: {script}")
-            with open(script, "r") as f:
-                content = f.read()
-            import_code_lines.extend(self.find_imports(content))
-        import_code_lines_str = "\n".join(import_code_lines)
+        if third_party is None:
+            third_party = self.find_third_party_modules()
+        requirements_list, unresolved = resolve_requirements(third_party)
+        logging.info(f"Resolved {len(requirements_list)} requirements locally, {len(unresolved)} unresolved")
+        if not unresolved:
+            return requirements_list
+
+        # only the import names missing from the local environment are left to the model
+        unresolved_str = "\n".join(unresolved)
         sys_instruction = (
-            "Based on the following Python code and the existing environment-exported `requirements.txt`, generate a new `requirements.txt` file. "
-            "Ensure that the final file accurately reflects the modules used in the code, removing any unnecessary dependencies and including the correct versions.\n"
-            "```python\n"
-            f"{import_code_lines_str}\n"
-            "```\n"
-            "Existing `requirements.txt` content:\n"
+            "The following Python import names are used in a project but are not installed in the current environment. "
+            "For each of them, give the pip requirement that provides it, with a version if you are confident about it. "
+            "Skip names that are not published packages.\n"
             "```\n"
-            f"{environment_requirements_str}\n"
+            f"{unresolved_str}\n"
             "```\n"
             "The output should be a markdown code snippet formatted in JSON, such as: "
             "```json {\"requirements\": [\"module1==1.0.0\", \"module2==2.0.0\"]} ```"
         )
         prompt = [{"role": "system", "content": sys_instruction}]
         logging.debug(f'prompt: {prompt}')
-        answer = get_model_answer(model_name=self.model, inputs_list=prompt, config_dir=self.config_dir)
-        requirements_list = parse_requirements_output(answer)
+        answer = self.ask_model(prompt)
+        requirements_list.extend(parse_requirements_output(answer))
         return requirements_list
 
-    def generate_file_description(self, script_path):
-        with open(script_path, "r") as f:
-            script_content = f.read()
+    def _map(self, func, items):
+        """Apply func to items with up to max_concurrency threads, keeping the order of items."""
+        if self.max_concurrency > 1 and len(items) > 1:
+            profiler = get_profiler()
+            parent = profiler.current_stage()
+
+            def run(item):
+                # worker threads do not inherit the caller's stage, so requests are attributed to a child stage
+                if parent is None:
+                    return func(item)
+                with profiler.stage(f"{parent}:part"):
+                    return func(item)
+
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+                return list(executor.map(run, items))
+        return [func(item) for item in items]
+
+    def _summarize_in_chunks(self, script_path, script_content, sys_instruction):
+        chunks = split_into_chunks(script_content, script_path, self.max_chunk_tokens)
+        logging.info(f"{script_path} is too large for a single request, summarizing it in {len(chunks)} chunks")
+        language_instruction = "用中文回答。" if self.language == "cn" else ""
+        chunk_instruction = (
+            'The following is one part of a larger code/script. Summarize the functionality of this part,'
+            ' including the functions and classes it defines, their input and output parameters, and key logic.'
+        ) + language_instruction
+        merge_instruction = (
+            'The following are summaries of consecutive parts of a larger code/script.'
+            ' Merge them into one summary that keeps the functions and classes, their input and output parameters,'
+            ' and key logic.'
+        ) + language_instruction
+
+        def ask(instruction, content):
+            prompt = [{"role": "system", "content": instruction}, {"role": "user", "content": content}]
+            return self.ask_model(prompt)
+
+        summaries = self._map(
+            lambda chunk: ask(chunk_instruction, f"File: {script_path}, starting at line {chunk[0]}\n\n{chunk[1]}"),
+            chunks)
+        # reduce in rounds while the partial summaries together are still over the budget
+        while True:
+            failed = next((summary for summary in summaries if is_error_answer(summary)), None)
+            if failed is not None:
+                return failed
+            if len(summaries) <= 2 or estimate_tokens("\n\n".join(summaries)) <= self.max_chunk_tokens:
+                break
+            groups, current, current_tokens = [], [], 0
+            for summary in summaries:
+                tokens = estimate_tokens(summary)
+                if len(current) >= 2 and current_tokens + tokens > self.max_chunk_tokens:
+                    groups.append(current)
+                    current, current_tokens = [], 0
+                current.append(summary)
+                current_tokens += tokens
+            groups.append(current)
+            summaries = self._map(lambda group: ask(merge_instruction, "\n\n".join(group)), groups)
+
+        parts = "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+        return ask(sys_instruction + ' The code is given as summaries of its consecutive parts.', parts)
+
+    def _count_bytes_read(self, path):
+        stat = self.get_inventory().stat(path)
+        get_profiler().count("bytes_read", stat.st_size if stat else 0)
+
+    def _description_instruction(self):
         sys_instruction = (
             'Please generate a summarized description that outlines the functionality of the following code/script,'
             ' including its input and output parameters, key algorithms or logic.'
@@ -201,9 +548,39 @@ class AutoReadme:
         )
         if self.language == "cn":
             sys_instruction += "用中文回答。"
-        prompt = [{"role": "system", "content": sys_instruction}, {"role": "user", "content": script_content}]
-        logging.debug(f'prompt: {prompt}')
-        answer = get_model_answer(model_name=self.model, inputs_list=prompt, config_dir=self.config_dir)
+        return sys_instruction
+
+    def _batch_instruction(self):
+        return self._description_instruction() + (
+            ' You will receive several files. Describe each of them separately.'
+            ' The output should be a markdown code snippet formatted in JSON that maps every file path to its'
+            ' description, such as: ```json {"path/a.py": "description of a.py", "path/b.sh": "description of b.sh"} ```'
+        )
+
+    def _description_cache_key(self, script_content, instruction=None):
+        return DescriptionCache.make_key(script_content, self.model, self.language,
+                                         instruction or self._description_instruction())
+
+    def generate_file_description(self, script_path):
+        with open(script_path, "r") as f:
+            script_content = f.read()
+        self._count_bytes_read(script_path)
+        sys_instruction = self._description_instruction()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._description_cache_key(script_content)
+            answer = self.cache.get(cache_key)
+            if answer is not None:
+                logging.debug(f'Cached description of {script_path}')
+                return answer
+        if estimate_tokens(script_content) > self.max_chunk_tokens:
+            answer = self._summarize_in_chunks(script_path, script_content, sys_instruction)
+        else:
+            prompt = [{"role": "system", "content": sys_instruction}, {"role": "user", "content": script_content}]
+            logging.debug(f'prompt: {prompt}')
+            answer = self.ask_model(prompt)
+        if cache_key is not None and not is_error_answer(answer):
+            self.cache.put(cache_key, answer)
         logging.debug(f'***** description of {script_path} *****')
         logging.debug(f'{answer}')
         logging.debug(f'*****')
@@ -215,15 +592,92 @@ class AutoReadme:
         if files == []:
             return {}
         dependency_content = {}
+        if "SCRIPT_DESCRIPTION.json" not in files and os.path.basename(self.checkpoint_path) in files:
+            # an interrupted run: describe what the checkpoint holds
+            files.append("SCRIPT_DESCRIPTION.json")
         for file in files:
-            if file == "requirements.txt" or file == "PROJECT_STRUCTURE.md" or file == "SCRIPT_DESCRIPTION.json":
+            if file == "requirements.txt" or file == "PROJECT_STRUCTURE.md":
                 with open(os.path.join(self.out_put_dir, file), "r") as f:
                     content = f.read()
                 dependency_content[file.title()] = content
+            elif file == "SCRIPT_DESCRIPTION.json":
+                dependency_content[file.title()] = format_descriptions(self.iter_script_descriptions())
         logging.debug(dependency_content)
         return dependency_content
 
-    def generate_readme(self):
+    def compact_dependencies(self, dependencies):
+        """
+        Bound the size of the README prompt: collapse the structure listing below structure_depth, then summarize the
+        script descriptions per directory and, if that is still too long, per top-level package.
+        """
+        total = sum(estimate_tokens(content) for content in dependencies.values())
+        if total <= self.readme_token_budget:
+            return dependencies
+        logging.info(f"Dependency content is about {total} tokens, compacting it to {self.readme_token_budget}")
+        dependencies = dict(dependencies)
+        structure_key, description_key = "Project_Structure.Md", "Script_Description.Json"
+        if structure_key in dependencies:
+            dependencies[structure_key] = collapse_structure(dependencies[structure_key], self.structure_depth)
+        if description_key not in dependencies:
+            return dependencies
+        others = sum(estimate_tokens(content) for key, content in dependencies.items() if key != description_key)
+        budget = max(self.readme_token_budget - others, self.readme_token_budget // 4)
+        try:
+            descriptions = json.loads(dependencies[description_key], object_pairs_hook=OrderedDict)
+        except ValueError:
+            dependencies[description_key] = truncate_to_tokens(dependencies[description_key], budget)
+            return dependencies
+        dependencies[description_key] = self._digest_descriptions(descriptions, budget)
+        return dependencies
+
+    def _digest_descriptions(self, descriptions, budget):
+        groups = group_by_directory(descriptions, self.project_dir)
+        digest = format_entries(OrderedDict((path, text) for group in groups.values() for path, text in group.items()))
+        if estimate_tokens(digest) <= budget:
+            return digest
+        for level, instruction_target in (("directory", "files of one directory"),
+                                          ("package", "directories of one top-level package")):
+            logging.info(f"Summarizing script descriptions per {level}: {len(groups)} groups")
+            target_tokens = max(budget // max(len(groups), 1), 50)
+            instruction = (
+                f"The following are descriptions of the {instruction_target} of a project."
+                f" Summarize what this part of the project does and its key components in at most"
+                f" {int(target_tokens * 0.75)} words."
+            ) + ("用中文回答。" if self.language == "cn" else "")
+            names = list(groups)
+            summaries = self._map(lambda name: self._summarize_group(instruction, groups[name]), names)
+            summaries = OrderedDict(zip(names, summaries))
+            digest = format_entries(summaries)
+            if estimate_tokens(digest) <= budget or level == "package":
+                break
+            groups = group_by_top_level(summaries)
+        return truncate_to_tokens(digest, budget)
+
+    def _summarize_group(self, instruction, entries):
+        if len(entries) == 1 and estimate_tokens(next(iter(entries.values()))) <= self.max_chunk_tokens // 4:
+            return next(iter(entries.values()))
+        # keep a single request within the chunk budget by giving every entry a fair share
+        share = max(self.max_chunk_tokens // len(entries), 100)
+        content = format_entries(OrderedDict((name, truncate_to_tokens(text, share)) for name, text in entries.items()))
+        cache_key = None
+        if self.cache is not None:
+            cache_key = DescriptionCache.make_key(content, self.model, self.language, instruction)
+            answer = self.cache.get(cache_key)
+            if answer is not None:
+                return answer
+        answer = self.ask_model([{"role": "system", "content": instruction}, {"role": "user", "content": content}])
+        if is_error_answer(answer):
+            # fall back to the raw descriptions; the final truncation keeps the prompt bounded
+            return content
+        if cache_key is not None:
+            self.cache.put(cache_key, answer)
+        return answer
+
+    def generate_readme(self, stream=False):
+        self.run_pipeline(["readme_prompt", "readme"], stream=stream)
+
+    def build_readme_prompt(self):
+        """:return: the README prompt built from the dependency files, or None if there are none."""
         sys_instruction = (
             "Generate a comprehensive README file for this project that includes, but is not limited to the following sections. If specific details are unknown, set <> as placeholders: "
             "1. Project Title: The name of the project."
@@ -239,10 +693,14 @@ class AutoReadme:
         )
         if self.language == "cn":
             sys_instruction += "用中文回答。"
-        dependencies = self.get_dependency_content()
+        profiler = get_profiler()
+        with profiler.stage("readme:dependencies"):
+            dependencies = self.get_dependency_content()
         if dependencies == {}:
             logging.error("No dependency files found. Please run 'generate_dependency' first.")
-            return
+            return None
+        with profiler.stage("readme:compact"):
+            dependencies = self.compact_dependencies(dependencies)
         query = (
             'The information of this project is as follows:\n'
             f'project_name: {self.project_name}\n'
@@ -253,13 +711,78 @@ class AutoReadme:
             query += f"\n\n{title}:\n{content}"
         prompt = [{"role": "system", "content": sys_instruction}, {"role": "user", "content": query}]
         logging.debug(f'prompt: {prompt}')
-        answer = get_model_answer(model_name=self.model, inputs_list=prompt, config_dir=self.config_dir)
+        return prompt
+
+    def request_readme(self, prompt, stream=False):
+        if prompt is None:
+            return
+        profiler = get_profiler()
+        if stream:
+            with profiler.stage("readme:request", stream=True):
+                self._stream_readme(prompt)
+            return
+        with profiler.stage("readme:request"):
+            answer = self.ask_model(prompt)
         logging.debug(f'***** README *****')
         logging.debug(f'{answer}')
         logging.debug(f'*****')
         save_content_to_file(answer, self.readme_path)
         logging.info(f"README has been generated and saved to {self.readme_path}")
 
+    def _stream_readme(self, prompt):
+        stream_response = self.ask_model(prompt, stream=True)
+        if isinstance(stream_response, str):
+            logging.error(f"README generation failed: {stream_response}")
+            return
+        try:
+            stream_content_to_file(iter_stream_content(stream_response), self.readme_path)
+        except Exception as e:
+            logging.error(f"README generation was interrupted, the partial result is in {self.readme_path}.partial: {e}")
+            return
+        logging.info(f"README has been generated and saved to {self.readme_path}")
+
+
+def parse_json_answer(answer):
+    """Parse a JSON answer that may be wrapped in a markdown code fence; None if it does not parse."""
+    text = str(answer).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+
+def format_descriptions(entries):
+    """Render (path, description) pairs as the indented JSON of SCRIPT_DESCRIPTION.json, one entry at a time."""
+    lines = [f"    {json.dumps(path, ensure_ascii=False)}: {json.dumps(description, ensure_ascii=False)}"
+             for path, description in entries]
+    return "{\n" + ",\n".join(lines) + "\n}" if lines else "{}"
+
+
+def stream_content_to_file(chunks, file_path, show_progress=True):
+    """
+    Write chunks to a temporary file next to file_path as they arrive and rename it over file_path at the end, so
+    readers never see a half-written file. If the stream breaks, what was received is kept in file_path + '.partial'.
+    """
+    start = time.monotonic()
+    received = 0
+    try:
+        with atomic_write(file_path, partial_path=f"{file_path}.partial") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                f.flush()
+                received += len(chunk)
+                if show_progress:
+                    sys.stderr.write(f"\rReceived {received} characters in {time.monotonic() - start:.1f}s")
+                    sys.stderr.flush()
+    finally:
+        if show_progress:
+            sys.stderr.write("\n")
+    logging.info(f"Content has been streamed to {file_path}")
+    return received
+
 
 def save_content_to_file(content, file_path):
     with open(file_path, "w", encoding='utf-8') as f:
@@ -307,6 +830,54 @@ if __name__ == "__main__":
     # New optional 'language' argument
     parser.add_argument('--language', type=str, choices=['cn', 'en'], default='en',
                         help="Language for the project. Options: 'cn' or 'en'. Default is 'en'.")
+    parser.add_argument('--max_concurrency', type=int, default=1,
+                        help="Maximum number of LLM requests in flight when describing scripts. Default is 1.")
+    parser.add_argument('--no_cache', action='store_true',
+                        help="Bypass the on-disk cache of script descriptions.")
+    parser.add_argument('--clear_cache', action='store_true',
+                        help="Clear the on-disk cache of script descriptions before running.")
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help="Directory for the description cache. Default is <config_dir>/cache.")
+    parser.add_argument('--cache_max_mb', type=float, default=256,
+                        help="Maximum size of the description cache in MB. Default is 256.")
+    parser.add_argument('--max_chunk_tokens', type=int, default=6000,
+                        help="Scripts larger than this (estimated tokens) are summarized in chunks. Default is 6000.")
+    parser.add_argument('--no_pack', action='store_true',
+                        help="Describe every script in its own request instead of packing small scripts together.")
+    parser.add_argument('--small_file_tokens', type=int, default=500,
+                        help="Scripts up to this size (estimated tokens) are packed into shared requests. Default is 500.")
+    parser.add_argument('--pack_token_budget', type=int, default=4000,
+                        help="Maximum size (estimated tokens) of one packed request. Default is 4000.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Keep the descriptions in <out_put_dir>/SCRIPT_DESCRIPTION.jsonl from an interrupted run "
+                             "and only describe the scripts that are missing or changed since.")
+    parser.add_argument('--readme_token_budget', type=int, default=12000,
+                        help="Project information above this many tokens is summarized before the README request. "
+                             "Default is 12000.")
+    parser.add_argument('--structure_depth', type=int, default=3,
+                        help="Depth below which the project structure is collapsed when it is summarized. Default is 3.")
+    parser.add_argument('--structure_max_depth', type=int, default=None,
+                        help="Deepest level listed in PROJECT_STRUCTURE.md. Default is unlimited.")
+    parser.add_argument('--structure_max_entries', type=int, default=None,
+                        help="Entries listed per directory in PROJECT_STRUCTURE.md; the rest is summarized.")
+    parser.add_argument('--structure_collapse_threshold', type=int, default=None,
+                        help="Directories with more entries than this, all files of one extension, are summarized "
+                             "in one line of PROJECT_STRUCTURE.md.")
+    parser.add_argument('--stages', type=str, nargs='+', default=None,
+                        choices=["structure", "requirements", "descriptions", "readme_prompt", "readme"],
+                        help="Only run these stages and the ones that depend on them; the outputs of the others "
+                             "are read from out_put_dir. Default is all of them.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the README to readme_path while it is being generated.")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and regenerate the affected outputs when project files change.")
+    parser.add_argument('--watch_interval', type=float, default=2.0,
+                        help="Seconds between polls of the project in watch mode. Default is 2.")
+    parser.add_argument('--debounce', type=float, default=5.0,
+                        help="Seconds without changes before regenerating in watch mode. Default is 5.")
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None,
+                        help="Record per-stage and per-request timings and tokens to a JSON trace "
+                             "(default <out_put_dir>/PROFILE_TRACE.json) and print a summary table.")
 
     # Parse the arguments
     args = parser.parse_args()
@@ -314,6 +885,11 @@ if __name__ == "__main__":
     # Set up logging
     logging.basicConfig(level=logging.INFO)
 
+    profiler = None
+    if args.profile is not None:
+        profiler = Profiler()
+        set_profiler(profiler)
+
     # Initialize AutoReadme with the provided arguments
     auto_readme = AutoReadme(
         project_name=args.project_name,
@@ -324,9 +900,34 @@ if __name__ == "__main__":
         readme_path=args.readme_path,
         project_description=args.project_description,
         config_dir=args.config_dir,
-        language=args.language
+        language=args.language,
+        max_concurrency=args.max_concurrency,
+        use_cache=not args.no_cache or args.clear_cache,
+        cache_dir=args.cache_dir,
+        cache_max_mb=args.cache_max_mb,
+        max_chunk_tokens=args.max_chunk_tokens,
+        readme_token_budget=args.readme_token_budget,
+        structure_depth=args.structure_depth,
+        structure_max_depth=args.structure_max_depth,
+        structure_max_entries=args.structure_max_entries,
+        structure_collapse_threshold=args.structure_collapse_threshold,
+        pack_small_files=not args.no_pack,
+        small_file_tokens=args.small_file_tokens,
+        pack_token_budget=args.pack_token_budget,
+        resume=args.resume
     )
+    if args.clear_cache:
+        auto_readme.cache.clear()
+        if args.no_cache:
+            auto_readme.cache = None
 
-    # Generate dependency and README files
-    auto_readme.generate_dependency()
-    auto_readme.generate_readme()
+    # Generate dependency and README files, overlapping the independent stages
+    auto_readme.run_pipeline(stages=args.stages, stream=args.stream, downstream=True)
+
+    if profiler is not None:
+        profiler.save(args.profile or os.path.join(auto_readme.out_put_dir, "PROFILE_TRACE.json"))
+        print(profiler.format_summary())
+
+    if args.watch:
+        from watcher import ReadmeWatcher
+        ReadmeWatcher(auto_readme, interval=args.watch_interval, debounce=args.debounce, stream=args.stream).run()
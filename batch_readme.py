@@ -0,0 +1,140 @@
+# Author: Lintao
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auto_readme import ROOT_DIR, AutoReadme
+from description_cache import DescriptionCache
+from llm_api import set_max_in_flight
+
+
+def load_manifest(manifest_path):
+    """
+    Read a JSON or YAML list of projects. Each entry needs project_name, project_dir and author, and may set
+    description, model_name, out_put_dir, readme_path and language. A mapping with a "projects" list is also accepted.
+    """
+    with open(manifest_path, "r", encoding='utf-8') as f:
+        if manifest_path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading a YAML manifest requires PyYAML: pip install pyyaml")
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = manifest.get("projects", [])
+    output_dirs = {}
+    for i, project in enumerate(manifest):
+        missing = [key for key in ("project_name", "project_dir", "author") if not project.get(key)]
+        if missing:
+            raise ValueError(f"Manifest entry #{i} is missing {', '.join(missing)}")
+        # two projects writing to one output directory would overwrite each other's files while running concurrently
+        out_put_dir = project.get("out_put_dir") or os.path.join(ROOT_DIR, 'output', project["project_name"])
+        out_put_dir = os.path.abspath(out_put_dir)
+        if out_put_dir in output_dirs:
+            raise ValueError(f"Manifest entries #{output_dirs[out_put_dir]} and #{i} both write to {out_put_dir}; "
+                             f"give them distinct project_name or out_put_dir values")
+        output_dirs[out_put_dir] = i
+    return manifest
+
+
+def run_project(project, options, cache):
+    name = project["project_name"]
+    status = {"project_name": name, "project_dir": project["project_dir"], "status": "ok", "error": None}
+    start = time.monotonic()
+    try:
+        if not os.path.isdir(project["project_dir"]):
+            raise FileNotFoundError(f"Project directory does not exist: {project['project_dir']}")
+        if project.get("out_put_dir"):
+            os.makedirs(project["out_put_dir"], exist_ok=True)
+        auto_readme = AutoReadme(
+            project_name=name,
+            project_dir=project["project_dir"],
+            author=project["author"],
+            model_name=project.get("model_name", options.model_name),
+            out_put_dir=project.get("out_put_dir"),
+            readme_path=project.get("readme_path"),
+            project_description=project.get("description"),
+            config_dir=options.config_dir,
+            language=project.get("language", options.language),
+            max_concurrency=options.max_concurrency,
+            use_cache=cache is not None,
+            cache=cache,
+            resume=options.resume,
+        )
+        status["out_put_dir"] = auto_readme.out_put_dir
+        auto_readme.run_pipeline()
+        status["failed_scripts"] = len(auto_readme.description_failures)
+        if auto_readme.description_failures:
+            status["status"] = "partial"
+    except Exception as e:
+        logging.exception(f"Batch run of {name} failed")
+        status["status"] = "failed"
+        status["error"] = f"{type(e).__name__}: {e}"
+    status["seconds"] = round(time.monotonic() - start, 2)
+    logging.info(f"{name}: {status['status']} in {status['seconds']}s")
+    return status
+
+
+def run_batch(manifest, options):
+    """
+    Run the AutoReadme pipeline for every project with `workers` projects at a time. All projects share one LLM
+    client per model (and so one key scheduler), one description cache and a global cap on the number of LLM requests
+    in flight.
+    """
+    set_max_in_flight(options.max_in_flight)
+    cache = None
+    if not options.no_cache:
+        config_dir = options.config_dir or os.path.join(ROOT_DIR, "config")
+        cache = DescriptionCache(options.cache_dir or os.path.join(config_dir, "cache"),
+                                 max_bytes=int(options.cache_max_mb * 1024 * 1024))
+    with ThreadPoolExecutor(max_workers=max(1, options.workers)) as executor:
+        statuses = list(executor.map(lambda project: run_project(project, options, cache), manifest))
+    return statuses
+
+
+def print_summary(statuses):
+    width = max([len(status["project_name"]) for status in statuses] + [7])
+    print(f"{'project':<{width}}  {'status':<8}  {'seconds':>8}  error")
+    for status in statuses:
+        print(f"{status['project_name']:<{width}}  {status['status']:<8}  {status['seconds']:>8.2f}  "
+              f"{status['error'] or ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate READMEs for many projects listed in a manifest.")
+    parser.add_argument('--manifest', type=str, required=True,
+                        help="JSON or YAML list of projects with project_name, project_dir, author and description.")
+    parser.add_argument('--workers', type=int, default=4, help="Number of projects processed at a time. Default is 4.")
+    parser.add_argument('--max_in_flight', type=int, default=32,
+                        help="Maximum number of LLM requests in flight across all projects. Default is 32.")
+    parser.add_argument('--max_concurrency', type=int, default=8,
+                        help="Maximum number of LLM requests in flight per project. Default is 8.")
+    parser.add_argument('--model_name', type=str, default=None, help="Default model name for all projects.")
+    parser.add_argument('--config_dir', type=str, default=None, help="Directory for configuration files.")
+    parser.add_argument('--language', type=str, choices=['cn', 'en'], default='en',
+                        help="Default language for all projects. Options: 'cn' or 'en'. Default is 'en'.")
+    parser.add_argument('--no_cache', action='store_true', help="Bypass the shared description cache.")
+    parser.add_argument('--cache_dir', type=str, default=None,
+                        help="Directory for the description cache. Default is <config_dir>/cache.")
+    parser.add_argument('--cache_max_mb', type=float, default=1024,
+                        help="Maximum size of the description cache in MB. Default is 1024.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Keep the descriptions checkpointed by an interrupted run of each project.")
+    parser.add_argument('--status_path', type=str, default=None,
+                        help="Where to write the per-project status summary. Default is output/batch_status.json.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(threadName)s %(levelname)s %(message)s")
+
+    statuses = run_batch(load_manifest(args.manifest), args)
+    status_path = args.status_path or os.path.join(ROOT_DIR, "output", "batch_status.json")
+    os.makedirs(os.path.dirname(os.path.abspath(status_path)), exist_ok=True)
+    with open(status_path, "w", encoding='utf-8') as f:
+        json.dump(statuses, f, ensure_ascii=False, indent=4)
+    print_summary(statuses)
+    print(f"Status summary has been saved to {status_path}")
@@ -0,0 +1,83 @@
+# Author: Lintao
+"""
+Micro-benchmark of GitignoreMatcher against the previous fnmatch loop on a synthetic tree.
+
+    python benchmarks/bench_gitignore.py --files 100000 --patterns 40
+"""
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gitignore import GitignoreMatcher  # noqa: E402
+
+PATTERNS = ["*.log", "*.tmp", "build/", "dist/", "/coverage", "**/__pycache__", "*.py[cod]", "node_modules/",
+            "docs/_build/", "*.egg-info/", ".venv/", "!important.log", "data/**/*.csv", "*.swp", ".DS_Store"]
+
+
+def legacy_is_ignored(project_dir, filepath, ignore_files):
+    relative_path = os.path.relpath(filepath, project_dir)
+    for pattern in ignore_files:
+        if fnmatch.fnmatch(relative_path, pattern):
+            return True
+    return False
+
+
+def make_patterns(count, rng):
+    patterns = list(PATTERNS)
+    while len(patterns) < count:
+        patterns.append(f"*.ext{rng.randint(0, 999)}" if rng.random() < 0.5 else f"gen_{rng.randint(0, 999)}/")
+    return patterns[:count]
+
+
+def make_paths(root, count, depth, rng):
+    names = ["src", "lib", "pkg", "tests", "build", "data", "docs", "utils", "core", "__pycache__"]
+    exts = [".py", ".log", ".csv", ".json", ".sh", ".pyc", ".md", ".tmp"]
+    paths = []
+    for i in range(count):
+        parts = [rng.choice(names) for _ in range(rng.randint(0, depth))]
+        paths.append(os.path.join(root, *parts, f"file_{i}{rng.choice(exts)}"))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ignore matching on a synthetic tree.")
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--patterns', type=int, default=40)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patterns = make_patterns(args.patterns, rng)
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, ".gitignore"), "w") as f:
+            f.write("\n".join(patterns))
+        os.makedirs(os.path.join(root, "src"))
+        with open(os.path.join(root, "src", ".gitignore"), "w") as f:
+            f.write("!keep.log\n*.csv\n")
+        paths = make_paths(root, args.files, args.depth, rng)
+
+        start = time.perf_counter()
+        legacy = sum(legacy_is_ignored(root, path, patterns) for path in paths)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher = GitignoreMatcher(root)
+        compiled = sum(matcher.is_ignored(path, False) for path in paths)
+        compiled_time = time.perf_counter() - start
+
+    print(f"{args.files} paths, {len(patterns)} patterns")
+    print(f"fnmatch loop:      {legacy_time:8.3f} s  ({legacy} ignored)")
+    print(f"GitignoreMatcher:  {compiled_time:8.3f} s  ({compiled} ignored)")
+    print(f"speedup:           {legacy_time / compiled_time:8.1f}x")
+    print("Ignored counts differ because the matcher implements full gitignore semantics "
+          "(directory patterns, '**', negation, nested files).")
+
+
+if __name__ == "__main__":
+    main()
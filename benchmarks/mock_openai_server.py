@@ -0,0 +1,171 @@
+# Author: Lintao
+"""
+A local stand-in for an OpenAI-compatible ChatCompletion endpoint, for benchmarks that must not spend API money.
+
+    python benchmarks/mock_openai_server.py --port 8765 --latency 0.3 --error_rate 0.01 --rate_limit_rate 0.05
+
+Point OPENAI_BASE in llm_config.json at http://127.0.0.1:8765/v1.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOpenAIServer:
+    """
+    Serves POST /v1/chat/completions (and /chat/completions) in a background thread. Every request sleeps for
+    `latency` seconds plus up to `jitter`, then fails with a 500 with probability error_rate, answers 429 with a
+    Retry-After header with probability rate_limit_rate, or returns `answer_words` words, streamed if requested.
+    Packed description requests (several "### File:" sections and a system prompt asking for JSON) are answered with a
+    JSON object keyed by those paths, as the real model would.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, jitter=0.05, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, answer_words=60, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.answer_words = answer_words
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "prompt_chars": 0}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _draw(self):
+        with self._lock:
+            return self._random.random(), self._random.random(), self._random.uniform(0, self.jitter)
+
+    @staticmethod
+    def _answer(messages, words):
+        system = " ".join(str(message.get("content", "")) for message in messages if message.get("role") == "system")
+        user = "\n".join(str(message.get("content", "")) for message in messages if message.get("role") != "system")
+        paths = re.findall(r"^### File: (.+)$", user, flags=re.MULTILINE)
+        if paths and "JSON" in system:
+            return "```json\n" + json.dumps({path: " ".join(words) for path in paths}, indent=2) + "\n```"
+        return " ".join(words)
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path.rstrip('/') not in ("/v1/chat/completions", "/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                messages = request.get("messages", [])
+                prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+                server._count("requests")
+                server._count("prompt_chars", prompt_chars)
+                error_draw, rate_limit_draw, jitter = server._draw()
+                time.sleep(server.latency + jitter)
+                if error_draw < server.error_rate:
+                    server._count("errors")
+                    self._send_json(500, {"error": {"message": "Mock server error", "type": "server_error"}})
+                    return
+                if rate_limit_draw < server.rate_limit_rate:
+                    server._count("rate_limited")
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                    {"Retry-After": str(server.retry_after)})
+                    return
+                words = [f"word{i}" for i in range(server.answer_words)]
+                answer = server._answer(messages, words)
+                model = request.get("model", "mock")
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                if request.get("stream"):
+                    self._stream(completion_id, model, answer.split(" "))
+                    return
+                self._send_json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": answer}}],
+                    "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(answer) // 4,
+                              "total_tokens": prompt_chars // 4 + len(answer) // 4},
+                })
+
+            def _stream(self, completion_id, model, words):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i, word in enumerate(words):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": {"content": word + " "},
+                                                          "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible ChatCompletion server.")
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds every request takes. Default is 0.2.")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Extra random latency in seconds. Default is 0.05.")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Probability of a 500 answer.")
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help="Probability of a 429 answer.")
+    parser.add_argument('--retry_after', type=float, default=1.0, help="Retry-After seconds sent with 429 answers.")
+    parser.add_argument('--answer_words', type=int, default=60, help="Number of words in every answer.")
+    args = parser.parse_args()
+
+    mock = MockOpenAIServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate_limit_rate,
+                            args.retry_after, args.answer_words)
+    print(f"Mock OpenAI server listening on {mock.base_url}")
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,188 @@
+# Author: Lintao
+"""
+Offline benchmark of AutoReadme: builds a synthetic project, starts a mock OpenAI-compatible server and times the
+file-system stages and the end-to-end generate_dependency / generate_readme flow. No API key or network is needed.
+
+    python benchmarks/run_benchmarks.py --files 2000 --latency 0.2 --output bench_results.json
+    python benchmarks/run_benchmarks.py --files 2000 --latency 0.2 --compare bench_results.json
+
+Results carry the git commit and the parameters, so runs of different commits with the same parameters can be
+compared with --compare.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from auto_readme import AutoReadme  # noqa: E402
+from mock_openai_server import MockOpenAIServer  # noqa: E402
+from synthetic_repo import generate_repo  # noqa: E402
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_config(config_dir, base_url, keys):
+    os.makedirs(config_dir, exist_ok=True)
+    config = {"OPENAI_CONFIG": {
+        "OPENAI_KEYS_BASES": [{"OPENAI_KEY": f"mock-key-{i}", "OPENAI_BASE": base_url} for i in range(keys)],
+        "OPENAI_TEMPERATURE": 0.5,
+        "OPENAI_MAX_TOKENS": 512,
+    }}
+    with open(os.path.join(config_dir, "llm_config.json"), "w") as f:
+        json.dump(config, f, indent=2)
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def summarize(runs):
+    return {"median": statistics.median(runs), "min": min(runs), "max": max(runs), "runs": runs}
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="auto_readme_bench_")
+    try:
+        return _run(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run(args, workdir):
+    repo_dir = os.path.join(workdir, "repo")
+    config_dir = os.path.join(workdir, "config")
+    file_count = generate_repo(repo_dir, files=args.files, depth=args.depth, fanout=args.fanout,
+                               ignore_patterns=args.ignore_patterns, nested_ignore_files=args.nested_ignore_files,
+                               seed=args.seed)
+
+    def new_auto_readme(run_index):
+        out_put_dir = os.path.join(workdir, "output", str(run_index))
+        os.makedirs(out_put_dir, exist_ok=True)
+        return AutoReadme(project_name="bench", project_dir=repo_dir, author="bench", model_name="mock-model",
+                          out_put_dir=out_put_dir, config_dir=config_dir, use_cache=False,
+                          max_concurrency=args.max_concurrency)
+
+    results = {}
+    mock = MockOpenAIServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                            rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed)
+    base_url = mock.start()
+    write_config(config_dir, base_url, args.keys)
+    try:
+        stage_runs = {"generate_project_structure": [], "find_all_scripts_and_config_files": [], "is_ignored": []}
+        all_paths = []
+        for root, dirs, files in os.walk(repo_dir):
+            all_paths += [(os.path.join(root, name), True) for name in dirs]
+            all_paths += [(os.path.join(root, name), False) for name in files]
+        for i in range(args.repeat):
+            auto_readme = new_auto_readme(i)
+            stage_runs["generate_project_structure"].append(
+                timed(lambda: auto_readme.generate_project_structure(repo_dir)))
+            auto_readme = new_auto_readme(i)
+            stage_runs["find_all_scripts_and_config_files"].append(
+                timed(auto_readme.find_all_scripts_and_config_files))
+            auto_readme = new_auto_readme(i)
+            stage_runs["is_ignored"].append(
+                timed(lambda: [auto_readme.is_ignored(path, is_dir=is_dir) for path, is_dir in all_paths]))
+        for name, runs in stage_runs.items():
+            results[name] = summarize(runs)
+
+        if not args.skip_llm:
+            dependency_runs, readme_runs = [], []
+            for i in range(args.repeat):
+                auto_readme = new_auto_readme(i)
+                dependency_runs.append(timed(auto_readme.generate_dependency))
+                readme_runs.append(timed(auto_readme.generate_readme))
+            results["generate_dependency"] = summarize(dependency_runs)
+            results["generate_readme"] = summarize(readme_runs)
+            results["end_to_end"] = summarize([a + b for a, b in zip(dependency_runs, readme_runs)])
+    finally:
+        mock.stop()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "files_written": file_count,
+        "paths_checked": len(all_paths),
+        "mock_server": mock.stats,
+        "results": results,
+    }
+
+
+def print_results(report, baseline=None):
+    print(f"commit {report['commit']}, {report['files_written']} files, python {report['python']}")
+    header = f"{'benchmark':<36} {'median s':>10} {'min s':>10}"
+    if baseline:
+        header += f" {'baseline s':>11} {'change':>8}"
+        ignored = ("repeat", "skip_llm")
+        if {k: v for k, v in baseline.get("params", {}).items() if k not in ignored} != \
+                {k: v for k, v in report["params"].items() if k not in ignored}:
+            print("Warning: the baseline was run with different parameters")
+    print(header)
+    for name, row in report["results"].items():
+        line = f"{name:<36} {row['median']:>10.4f} {row['min']:>10.4f}"
+        if baseline and name in baseline.get("results", {}):
+            base = baseline["results"][name]["median"]
+            change = (row["median"] - base) / base * 100 if base else 0.0
+            line += f" {base:>11.4f} {change:>+7.1f}%"
+        print(line)
+    print(f"mock server: {report['mock_server']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AutoReadme offline against a mock LLM server.")
+    parser.add_argument('--files', type=int, default=1000, help="Files in the synthetic project. Default is 1000.")
+    parser.add_argument('--depth', type=int, default=4, help="Directory depth of the synthetic project.")
+    parser.add_argument('--fanout', type=int, default=5, help="Sub-directories per directory.")
+    parser.add_argument('--ignore_patterns', type=int, default=20, help="Patterns in the top-level .gitignore.")
+    parser.add_argument('--nested_ignore_files', type=int, default=5, help="Number of nested .gitignore files.")
+    parser.add_argument('--latency', type=float, default=0.1, help="Mock server latency per request in seconds.")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Mock server random extra latency in seconds.")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Probability of a 500 answer.")
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help="Probability of a 429 answer.")
+    parser.add_argument('--retry_after', type=float, default=0.5, help="Retry-After seconds for 429 answers.")
+    parser.add_argument('--keys', type=int, default=1, help="Number of API keys in the generated config.")
+    parser.add_argument('--max_concurrency', type=int, default=8, help="AutoReadme max_concurrency.")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per benchmark; the median is reported.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip_llm', action='store_true', help="Only run the file-system stage benchmarks.")
+    parser.add_argument('--output', type=str, default=None, help="Write the results to this JSON file.")
+    parser.add_argument('--compare', type=str, default=None, help="Compare with the results in this JSON file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    print_results(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results have been saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Author: Lintao
+"""
+Generate a synthetic project tree for benchmarks.
+
+    python benchmarks/synthetic_repo.py /tmp/synthetic --files 2000 --depth 4 --ignore_patterns 30
+"""
+import argparse
+import os
+import random
+
+IMPORTS = ["import os", "import json", "import numpy as np", "import requests", "from collections import OrderedDict",
+           "import pandas as pd", "from pathlib import Path", "import yaml"]
+IGNORED_DIRS = ["build", "dist", "node_modules", ".venv", "__pycache__"]
+BASE_PATTERNS = ["*.log", "*.tmp", "build/", "dist/", "node_modules/", ".venv/", "__pycache__/", "*.py[cod]",
+                 "!important.log", "/coverage", "data/**/*.csv"]
+
+
+def _python_source(rng, functions):
+    lines = rng.sample(IMPORTS, 3) + [""]
+    for i in range(functions):
+        lines += [f"def function_{i}(value, factor={rng.randint(1, 9)}):",
+                  f'    """Scale value by factor and add {i}."""',
+                  "    result = value * factor",
+                  f"    return result + {i}",
+                  ""]
+    return "\n".join(lines)
+
+
+def generate_repo(root, files=1000, depth=4, fanout=5, ignore_patterns=20, nested_ignore_files=5,
+                  ignored_fraction=0.1, functions=10, seed=0):
+    """
+    Write a tree of roughly `files` files (mostly .py, some .sh, .json under config/ and data files) spread over
+    directories up to `depth` levels deep with `fanout` sub-directories each. Around `ignored_fraction` of the files
+    are put under directories the .gitignore excludes. :return: number of files written.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    directories = [""]
+    frontier = [""]
+    for _ in range(depth):
+        next_frontier = []
+        for parent in frontier:
+            for i in range(fanout):
+                child = os.path.join(parent, f"pkg{i}") if parent else f"pkg{i}"
+                directories.append(child)
+                next_frontier.append(child)
+        frontier = next_frontier
+        if len(directories) > files:
+            break
+    directories += ["config", "scripts"]
+
+    patterns = list(BASE_PATTERNS)
+    while len(patterns) < ignore_patterns:
+        patterns.append(f"*.gen{len(patterns)}" if rng.random() < 0.5 else f"generated_{len(patterns)}/")
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("# synthetic ignore file\n" + "\n".join(patterns[:ignore_patterns]) + "\n")
+    for directory in rng.sample(directories[1:], min(nested_ignore_files, len(directories) - 1)):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+        with open(os.path.join(root, directory, ".gitignore"), "w") as f:
+            f.write("*.cache\n!keep.cache\nlocal_only/\n")
+
+    written = 0
+    for i in range(files):
+        directory = rng.choice(directories)
+        if rng.random() < ignored_fraction:
+            directory = os.path.join(directory, rng.choice(IGNORED_DIRS))
+        kind = rng.random()
+        if directory.startswith("config"):
+            name, content = f"settings_{i}.json", '{"key": %d, "enabled": true}\n' % i
+        elif kind < 0.7:
+            name, content = f"module_{i}.py", _python_source(rng, functions)
+        elif kind < 0.8:
+            name, content = f"run_{i}.sh", f"#!/bin/bash\necho step {i}\npython module_{i}.py \"$@\"\n"
+        elif kind < 0.9:
+            name, content = f"output_{i}.log", "log line\n" * 5
+        else:
+            name, content = f"notes_{i}.md", f"# Notes {i}\n"
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+        with open(os.path.join(root, directory, name), "w") as f:
+            f.write(content)
+        written += 1
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic project tree.")
+    parser.add_argument('root', type=str, help="Directory to create the tree in.")
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fanout', type=int, default=5)
+    parser.add_argument('--ignore_patterns', type=int, default=20)
+    parser.add_argument('--nested_ignore_files', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    count = generate_repo(args.root, args.files, args.depth, args.fanout, args.ignore_patterns,
+                          args.nested_ignore_files, seed=args.seed)
+    print(f"Wrote {count} files to {args.root}")
@@ -0,0 +1,128 @@
+# Author: Lintao
+import json
+import logging
+import os
+import threading
+
+from project_structure import atomic_write
+
+
+class DescriptionCheckpoint:
+    """
+    Append-only JSONL record of finished script descriptions, one {"path", "description", "mtime_ns", "size", "model",
+    "language"} object per line, flushed as soon as each description is done so that an interrupted run loses nothing
+    it paid for. Only byte offsets are indexed in memory; descriptions are read back one at a time.
+    """
+
+    def __init__(self, path, resume=False, model=None, language=None):
+        self.path = path
+        self.model = model
+        self.language = language
+        self._lock = threading.Lock()
+        self._offsets = {}  # path -> (byte offset of its latest line, mtime_ns, size, model, language)
+        if resume and os.path.exists(path):
+            self._load_index()
+            logging.info(f"Resuming from {path}: {len(self._offsets)} descriptions already done")
+        else:
+            open(path, "w").close()
+        self._file = open(path, "a", encoding='utf-8')
+
+    def _load_index(self):
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._offsets[record["path"]] = (offset, record.get("mtime_ns"), record.get("size"),
+                                                     record.get("model"), record.get("language"))
+                except (ValueError, KeyError):
+                    # the last line may be cut short by a crash
+                    logging.debug(f"Skipping a broken line at byte {offset} of {self.path}")
+                offset += len(line)
+        if offset and not line.endswith(b"\n"):
+            with open(self.path, "ab") as f:
+                f.write(b"\n")
+
+    def is_done(self, path, stat=None):
+        """
+        True if path has a description made by this model in this language from a file with the same mtime and size.
+        """
+        entry = self._offsets.get(path)
+        if entry is None or entry[3:] != (self.model, self.language):
+            return False
+        if stat is None:
+            return True
+        return entry[1] == stat.st_mtime_ns and entry[2] == stat.st_size
+
+    def append(self, path, description, stat=None):
+        record = {"path": path, "description": description,
+                  "mtime_ns": stat.st_mtime_ns if stat else None, "size": stat.st_size if stat else None,
+                  "model": self.model, "language": self.language}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(line)
+            self._file.flush()
+            self._offsets[path] = (offset, record["mtime_ns"], record["size"], self.model, self.language)
+
+    def iter_descriptions(self, paths=None):
+        """Yield (path, description) for paths (default: all, in the order they were first written)."""
+        with self._lock:
+            self._file.flush()
+            offsets = dict(self._offsets)
+        if paths is None:
+            paths = list(offsets)
+        with open(self.path, "rb") as f:
+            for path in paths:
+                entry = offsets.get(path)
+                if entry is None:
+                    continue
+                f.seek(entry[0])
+                yield path, json.loads(f.readline())["description"]
+
+    def compact_to_json(self, json_path, paths=None):
+        """Write SCRIPT_DESCRIPTION.json from the checkpoint one entry at a time. :return: the number of entries."""
+        count = 0
+        with atomic_write(json_path) as f:
+            f.write("{")
+            for path, description in self.iter_descriptions(paths):
+                f.write("," if count else "")
+                f.write(f"\n    {json.dumps(path, ensure_ascii=False)}: {json.dumps(description, ensure_ascii=False)}")
+                count += 1
+            f.write("\n}" if count else "}")
+        return count
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def iter_json_object(json_path):
+    """
+    Yield the (key, value) pairs of a JSON object file as written by json.dump(indent=...) or compact_to_json, one
+    entry per line, without parsing the whole file. Files in any other layout are parsed in one go.
+    """
+    decoder = json.JSONDecoder()
+    count = 0
+    with open(json_path, "r", encoding='utf-8') as f:
+        if f.readline().strip() == "{":
+            try:
+                for line in f:
+                    line = line.strip().rstrip(",")
+                    if not line or line == "}":
+                        continue
+                    key, end = decoder.raw_decode(line)
+                    rest = line[end:].lstrip()
+                    if not rest.startswith(":"):
+                        raise ValueError(f"Unexpected layout of {json_path}")
+                    value, end = decoder.raw_decode(rest[1:].lstrip())
+                    if end != len(rest[1:].lstrip()):
+                        raise ValueError(f"Unexpected layout of {json_path}")
+                    yield key, value
+                    count += 1
+                return
+            except ValueError:
+                pass
+        f.seek(0)
+        yield from list(json.load(f).items())[count:]
@@ -0,0 +1,83 @@
+# Author: Lintao
+import ast
+import logging
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for code and English); no tokenizer dependency needed."""
+    return (len(text) + 3) // 4
+
+
+def _line_windows(lines, start, max_tokens):
+    """
+    Split lines into consecutive windows of at most max_tokens. A single line longer than that (e.g. minified JSON) is
+    cut by characters. :return: [(first line number, text), ...]
+    """
+    windows = []
+    current, current_tokens, first = [], 0, start
+    max_chars = max_tokens * 4
+    for offset, line in enumerate(lines):
+        for piece_start in range(0, max(len(line), 1), max_chars):
+            piece = line[piece_start:piece_start + max_chars]
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                windows.append((first, "".join(current)))
+                current, current_tokens, first = [], 0, start + offset
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        windows.append((first, "".join(current)))
+    return windows
+
+
+def _python_boundaries(content):
+    """First line (1-based) of every top-level def/class, decorators included, or None if the code does not parse."""
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+    boundaries = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            decorators = [decorator.lineno for decorator in node.decorator_list]
+            boundaries.append(min([node.lineno] + decorators))
+    return boundaries
+
+
+def split_into_chunks(content, file_path, max_tokens):
+    """
+    Split a source file into chunks of at most max_tokens (estimated). Python files are cut at top-level def/class
+    boundaries and neighbouring definitions are packed together; other files, code that does not parse and single
+    definitions larger than the budget are cut into line windows.
+    :return: [(first line number, chunk text), ...]
+    """
+    lines = content.splitlines(keepends=True)
+    boundaries = _python_boundaries(content) if file_path.endswith(".py") else None
+    if not boundaries:
+        return _line_windows(lines, 1, max_tokens)
+
+    starts = sorted(set([1] + boundaries))
+    segments = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] - 1 if i + 1 < len(starts) else len(lines)
+        segments.append((start, lines[start - 1:end]))
+
+    chunks = []
+    current, current_tokens, first = [], 0, 1
+    for start, segment_lines in segments:
+        text = "".join(segment_lines)
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append((first, "".join(current)))
+            current, current_tokens = [], 0
+        if tokens > max_tokens:
+            chunks.extend(_line_windows(segment_lines, start, max_tokens))
+            continue
+        if not current:
+            first = start
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append((first, "".join(current)))
+    logging.debug(f"Split {file_path} into {len(chunks)} chunks")
+    return chunks
@@ -0,0 +1,97 @@
+# Author: Lintao
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+class DescriptionCache:
+    """
+    On-disk, content-addressed cache of LLM answers. Each entry is a small JSON file named by the hash of its inputs;
+    the file mtime doubles as the last-access time, so the least recently used entries are evicted first once the
+    cache grows beyond max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+        logging.info(f"Description cache at {cache_dir}: {self._total_bytes / 1024:.1f} KiB in use")
+
+    @staticmethod
+    def make_key(content, model_name, language, prompt):
+        sha = hashlib.sha256()
+        for part in (content, model_name, language, prompt):
+            data = part.encode('utf-8', errors='surrogatepass') if isinstance(part, str) else bytes(part or b'')
+            # length prefix keeps ("ab", "c") and ("a", "bc") apart
+            sha.update(len(data).to_bytes(8, 'big'))
+            sha.update(data)
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _entries(self):
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding='utf-8') as f:
+                value = json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        logging.debug(f"Cache hit: {key}")
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = json.dumps({"value": value, "created": time.time()}, ensure_ascii=False)
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            f.write(data)
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._total_bytes += os.path.getsize(path) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._total_bytes = sum(size for _, _, size in entries)
+        # evict down to 90% so that a full cache does not rescan on every put
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for path, _, size in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            evicted += 1
+        logging.info(f"Evicted {evicted} entries from description cache")
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
+        logging.info(f"Description cache at {self.cache_dir} has been cleared")
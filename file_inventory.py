@@ -0,0 +1,94 @@
+# Author: Lintao
+import hashlib
+import logging
+import os
+import time
+
+# Directories that never belong to the documented project, whatever the ignore files say.
+ALWAYS_IGNORED_DIRS = {".git", ".hg", ".svn"}
+
+
+def file_digest(path):
+    """SHA-1 of the file content, read in blocks; None if it cannot be read."""
+    sha = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                sha.update(block)
+    except OSError:
+        return None
+    return sha.hexdigest()
+
+
+class FileInventory:
+    """
+    A single os.scandir pass over a project tree. Ignored directories are pruned before they are entered, and the
+    directory listings and file stat results are kept so that every pipeline stage can reuse them instead of walking
+    the tree again.
+    """
+
+    def __init__(self, root_dir, is_ignored=None):
+        """
+        :param root_dir: directory to scan.
+        :param is_ignored: optional callable (path, is_dir) -> bool deciding whether an entry is skipped.
+        """
+        self.root_dir = root_dir
+        self.is_ignored = is_ignored
+        self.children = {}  # directory path -> sorted [(name, is_dir), ...]
+        self.files = []  # file paths, directories visited top-down like os.walk
+        self.stats = {}  # file path -> os.stat_result
+        self.ignore_checks = 0
+        self.ignore_seconds = 0.0
+        self._scan()
+
+    def _scan(self):
+        logging.info(f"Scanning {self.root_dir}")
+        stack = [self.root_dir]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                logging.warning(f"Cannot list {dir_path}: {e}")
+                self.children[dir_path] = []
+                continue
+            listing = []
+            sub_dirs = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir and entry.name in ALWAYS_IGNORED_DIRS:
+                    continue
+                item_path = os.path.join(dir_path, entry.name)
+                if self.is_ignored is not None:
+                    start = time.perf_counter()
+                    ignored = self.is_ignored(item_path, is_dir)
+                    self.ignore_seconds += time.perf_counter() - start
+                    self.ignore_checks += 1
+                    if ignored:
+                        continue
+                listing.append((entry.name, is_dir))
+                if is_dir:
+                    # do not follow symlinked directories, os.walk does not either
+                    if not entry.is_symlink():
+                        sub_dirs.append(item_path)
+                    continue
+                try:
+                    self.stats[item_path] = entry.stat()
+                except OSError as e:
+                    logging.warning(f"Cannot stat {item_path}: {e}")
+                    continue
+                self.files.append(item_path)
+            self.children[dir_path] = listing
+            stack.extend(reversed(sub_dirs))
+        logging.info(f"Scanned {len(self.children)} directories and {len(self.files)} files")
+
+    def listdir(self, dir_path):
+        """Sorted [(name, is_dir), ...] of a scanned directory; unknown or pruned directories are empty."""
+        return self.children.get(dir_path, [])
+
+    def stat(self, file_path):
+        return self.stats.get(file_path)
@@ -1,28 +1,32 @@
 # Author: Lintao
-import os
+import argparse
 
+from project_structure import iter_structure_lines, write_structure
 
-def generate_project_structure(dir_path, indent_level=0):
-    markdown_lines = []
-    for item in sorted(os.listdir(dir_path)):
-        item_path = os.path.join(dir_path, item)
-        if os.path.isdir(item_path):
-            markdown_lines.append(f"{'  ' * indent_level}- **{item}/**")
-            markdown_lines.extend(generate_project_structure(item_path, indent_level + 1))
-        else:
-            markdown_lines.append(f"{'  ' * indent_level}- {item}")
-    return markdown_lines
 
+def generate_project_structure(dir_path, indent_level=0, max_depth=None, max_entries=None, collapse_threshold=None):
+    return list(iter_structure_lines(dir_path, max_depth=max_depth, max_entries=max_entries,
+                                     collapse_threshold=collapse_threshold, indent_level=indent_level))
 
-def save_markdown_structure(dir_path, output_file="PROJECT_STRUCTURE.md"):
-    project_structure = generate_project_structure(dir_path)
-    with open(output_file, "w") as f:
-        f.write("# Project Structure\n\n")
-        f.write("\n".join(project_structure))
+
+def save_markdown_structure(dir_path, output_file="PROJECT_STRUCTURE.md", max_depth=None, max_entries=None,
+                            collapse_threshold=None):
+    # lines are streamed to the file, so memory use does not grow with the size of the tree
+    lines = iter_structure_lines(dir_path, max_depth=max_depth, max_entries=max_entries,
+                                 collapse_threshold=collapse_threshold)
+    write_structure(lines, output_file, header="# Project Structure\n\n")
     print(f"Project structure has been saved to {output_file}")
 
 
 # Example usage
 if __name__ == "__main__":
-    project_directory = "./"  # Replace with your project directory
-    save_markdown_structure(project_directory)
+    parser = argparse.ArgumentParser(description="Write the structure of a directory as markdown.")
+    parser.add_argument('project_directory', type=str, nargs='?', default="./", help="Directory to describe.")
+    parser.add_argument('--output_file', type=str, default="PROJECT_STRUCTURE.md")
+    parser.add_argument('--max_depth', type=int, default=None, help="Deepest level listed. Default is unlimited.")
+    parser.add_argument('--max_entries', type=int, default=None, help="Entries listed per directory.")
+    parser.add_argument('--collapse_threshold', type=int, default=None,
+                        help="Summarize larger directories that only hold files of one extension in one line.")
+    args = parser.parse_args()
+    save_markdown_structure(args.project_directory, args.output_file, args.max_depth, args.max_entries,
+                            args.collapse_threshold)
@@ -0,0 +1,214 @@
+# Author: Lintao
+import logging
+import os
+import re
+
+
+def _translate(pattern):
+    """Translate one gitignore glob (without the leading '!' and trailing '/') into a regular expression body."""
+    i, n = 0, len(pattern)
+    res = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i) and (i == 0 or pattern[i - 1] == '/'):
+                if i + 2 == n:
+                    res.append('.*')  # trailing '/**': everything inside
+                    i += 2
+                    continue
+                if pattern[i + 2] == '/':
+                    res.append('(?:.*/)?')  # leading or inner '**/': zero or more directories
+                    i += 3
+                    continue
+            res.append('[^/]*')
+            while i < n and pattern[i] == '*':
+                i += 1
+            continue
+        if c == '?':
+            res.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                res.append('\\[')
+            else:
+                stuff = pattern[i + 1:j].replace('\\', '\\\\')
+                if stuff[0] in '!^':
+                    stuff = '^/' + stuff[1:]
+                res.append(f'[{stuff}]')
+                i = j + 1
+                continue
+        elif c == '\\' and i + 1 < n:
+            res.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            res.append(re.escape(c))
+        i += 1
+    return ''.join(res)
+
+
+def parse_pattern(line):
+    """
+    Parse one line of an ignore file.
+    :return: (regex body, negate, dir_only), or None for blank lines and comments.
+    """
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '  # an escaped trailing space is kept
+    line = stripped
+    negate = False
+    if line.startswith('!'):
+        negate = True
+        line = line[1:]
+    elif line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # a slash at the beginning or in the middle anchors the pattern to the directory of the ignore file
+    anchored = '/' in line
+    body = _translate(line.lstrip('/'))
+    if not anchored:
+        body = '(?:.*/)?' + body
+    return body, negate, dir_only
+
+
+class IgnoreRules:
+    """
+    The patterns of one ignore file, compiled into a single regex for files and one for directories. Alternatives are
+    joined in reverse order so that the first alternative that matches is the last pattern in the file, which is the
+    one that decides in git.
+    """
+
+    def __init__(self, patterns):
+        rules = [rule for rule in (parse_pattern(pattern) for pattern in patterns) if rule is not None]
+        self.size = len(rules)
+        self._file_regex, self._file_negate = self._combine([rule for rule in rules if not rule[2]])
+        self._dir_regex, self._dir_negate = self._combine(rules)
+
+    @staticmethod
+    def _combine(rules):
+        if not rules:
+            return None, []
+        rules = rules[::-1]
+        regex = re.compile('(?:' + '|'.join(f'({body})' for body, _, _ in rules) + r')\Z', re.DOTALL)
+        return regex, [negate for _, negate, _ in rules]
+
+    def match(self, relative_path, is_dir):
+        """:return: True if ignored, False if re-included by a negated pattern, None if no pattern matches."""
+        regex, negate = (self._dir_regex, self._dir_negate) if is_dir else (self._file_regex, self._file_negate)
+        if regex is None:
+            return None
+        m = regex.match(relative_path)
+        if m is None:
+            return None
+        return not negate[m.lastindex - 1]
+
+
+def read_patterns(path):
+    try:
+        with open(path, "r", encoding='utf-8', errors='replace') as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+
+class GitignoreMatcher:
+    """
+    Answers "is this path ignored?" for a project the way git does: .gitignore files in every directory (deeper files
+    take precedence), .git/info/exclude, negation, anchored and directory-only patterns. Each ignore file is compiled
+    once, the first time its directory is queried, and the decisions for directories are memoized.
+    """
+
+    IGNORE_FILE = ".gitignore"
+
+    def __init__(self, root_dir, extra_patterns=None):
+        self.root_dir = os.path.abspath(root_dir)
+        # paths handed in by the inventory start with the root as it was given, so they can be sliced without relpath
+        self._prefixes = [os.path.join(self.root_dir, '')]
+        given_root = os.path.normpath(root_dir)
+        if not os.path.isabs(given_root):
+            self._prefixes.append(os.path.join(given_root, '') if given_root != '.' else '.' + os.sep)
+        self._rules = {}  # relative directory ('' for root) -> IgnoreRules or None
+        self._ignored_dirs = {}  # relative directory -> bool
+        exclude = read_patterns(os.path.join(self.root_dir, ".git", "info", "exclude"))
+        self._fallback_rules = IgnoreRules(exclude + list(extra_patterns or []))
+        logging.debug(f"Loaded {self._fallback_rules.size} patterns from .git/info/exclude")
+
+    def relative(self, path):
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                relative_path = path[len(prefix):]
+                if os.sep != '/':
+                    relative_path = relative_path.replace(os.sep, '/')
+                if relative_path and './' not in relative_path and '//' not in relative_path \
+                        and not relative_path.endswith('.'):
+                    return relative_path
+                break
+        relative_path = os.path.relpath(os.path.abspath(path), self.root_dir)
+        if os.sep != '/':
+            relative_path = relative_path.replace(os.sep, '/')
+        return relative_path
+
+    def _rules_for(self, relative_dir):
+        try:
+            return self._rules[relative_dir]
+        except KeyError:
+            pass
+        patterns = read_patterns(os.path.join(self.root_dir, relative_dir, self.IGNORE_FILE))
+        rules = IgnoreRules(patterns) if patterns else None
+        if rules is not None and rules.size == 0:
+            rules = None
+        if rules is not None:
+            logging.debug(f"Loaded {rules.size} patterns from {os.path.join(relative_dir, self.IGNORE_FILE)}")
+        self._rules[relative_dir] = rules
+        return rules
+
+    def _match(self, relative_path, is_dir):
+        parts = relative_path.split('/')
+        for depth in range(len(parts) - 1, -1, -1):
+            rules = self._rules_for('/'.join(parts[:depth]))
+            if rules is None:
+                continue
+            decision = rules.match('/'.join(parts[depth:]), is_dir)
+            if decision is not None:
+                return decision
+        return bool(self._fallback_rules.match(relative_path, is_dir))
+
+    def _is_dir_ignored(self, relative_dir):
+        try:
+            return self._ignored_dirs[relative_dir]
+        except KeyError:
+            pass
+        parent = relative_dir.rpartition('/')[0]
+        ignored = (bool(parent) and self._is_dir_ignored(parent)) or self._match(relative_dir, True)
+        self._ignored_dirs[relative_dir] = ignored
+        return ignored
+
+    def is_ignored(self, path, is_dir=None):
+        """
+        :param path: absolute path, or path relative to the working directory, inside root_dir.
+        :param is_dir: whether path is a directory; looked up on disk when None.
+        """
+        relative_path = self.relative(path)
+        if relative_path == '.' or relative_path.startswith('../'):
+            return False
+        if is_dir is None:
+            is_dir = os.path.isdir(path)
+        if is_dir:
+            return self._is_dir_ignored(relative_path)
+        parent = relative_path.rpartition('/')[0]
+        # nothing inside an ignored directory can be re-included
+        if parent and self._is_dir_ignored(parent):
+            return True
+        return self._match(relative_path, False)
@@ -0,0 +1,141 @@
+# Author: Lintao
+import email.utils
+import logging
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Refills rate_per_minute units per minute up to one minute's worth; a rate of None means unlimited."""
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0 if rate_per_minute else None
+        self.capacity = float(rate_per_minute) if rate_per_minute else None
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.rate is None:
+            return
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available (0 if it is available now)."""
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        # a single request larger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount, now):
+        if self.rate is None:
+            return
+        self._refill(now)
+        self.level -= amount  # may go negative when the actual usage is higher than estimated
+
+
+class KeyState:
+    def __init__(self, index, rpm=None, tpm=None):
+        self.index = index
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.circuit_opens = 0
+
+    def wait_time(self, tokens, now):
+        return max(self.blocked_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header, which is either a number of seconds or an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class KeyScheduler:
+    """
+    Spreads requests over all configured API keys. Every key has its own requests/min and tokens/min buckets, keys
+    that answer 429 are parked for Retry-After seconds, and a key that keeps failing has its circuit opened for an
+    increasing cool-down. Callers only wait when no key at all can take the request.
+    """
+
+    def __init__(self, limits, failure_threshold=3, cooldown=30.0, max_backoff=60.0):
+        """
+        :param limits: one (requests per minute, tokens per minute) pair per key; None means unlimited.
+        """
+        self.keys = [KeyState(index, rpm, tpm) for index, (rpm, tpm) in enumerate(limits)]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_backoff = max_backoff
+        self._next = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens=0, timeout=None):
+        """
+        Reserve a request slot. :return: the index of the key to use, or None if none became available in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                best, best_wait = None, None
+                # round-robin start so that equally idle keys share the load
+                for offset in range(len(self.keys)):
+                    key = self.keys[(self._next + offset) % len(self.keys)]
+                    wait = key.wait_time(tokens, now)
+                    if best_wait is None or wait < best_wait:
+                        best, best_wait = key, wait
+                    if wait == 0:
+                        break
+                if best_wait == 0:
+                    best.requests.consume(1, now)
+                    best.tokens.consume(tokens, now)
+                    self._next = (best.index + 1) % len(self.keys)
+                    return best.index
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+                    best_wait = min(best_wait, deadline - now)
+                logging.debug(f"All API keys are busy, waiting {best_wait:.2f} seconds")
+                self._condition.wait(best_wait)
+
+    def record_tokens(self, index, tokens):
+        """Charge tokens that were not known at acquire time, e.g. the completion."""
+        with self._condition:
+            self.keys[index].tokens.consume(tokens, time.monotonic())
+
+    def release(self, index, success, retry_after=None):
+        """
+        :param success: False only for failures that say something about the key (connection errors, 5xx, 429, auth);
+            requests rejected for their own content are released as successes so they cannot open the circuit.
+        """
+        with self._condition:
+            key = self.keys[index]
+            now = time.monotonic()
+            if success:
+                key.failures = 0
+                key.circuit_opens = 0
+            else:
+                key.failures += 1
+                if retry_after is not None:
+                    delay = retry_after
+                elif key.failures >= self.failure_threshold:
+                    key.circuit_opens += 1
+                    delay = min(self.cooldown * 2 ** (key.circuit_opens - 1), 10 * self.cooldown)
+                    logging.warning(f"API key #{index} failed {key.failures} times, pausing it for {delay:.0f} seconds")
+                else:
+                    delay = min(2 ** key.failures + random.uniform(0, 1), self.max_backoff)  # backoff with jitter
+                key.blocked_until = max(key.blocked_until, now + delay)
+            self._condition.notify_all()
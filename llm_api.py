@@ -2,89 +2,186 @@
 # Author: Lintao
 import json
 import os
-import random
+import threading
 import time
 from pathlib import Path
 import openai
+from chunking import estimate_tokens
+from key_scheduler import KeyScheduler, parse_retry_after
+from profiler import get_profiler
 
 ROOT_PATH = Path(os.path.abspath(__file__)).parents[0]  # 项目根目录
+MISSING_CONFIG_ANSWER = "Lack of configuration file. --llm_config.json--"
+FAILED_ANSWER = "An error occurred, and the request could not be completed after retries."
 
 
-def get_model_answer(model_name, inputs_list, config_dir=None, stream=False):
+def is_error_answer(answer):
+    return answer in (MISSING_CONFIG_ANSWER, FAILED_ANSWER)
+
+
+def is_request_error(error):
+    """
+    True for errors caused by the request itself (4xx other than 401 and 429, e.g. context length exceeded): retrying
+    will not help, and they say nothing about the health of the API key.
+    """
+    if isinstance(error, openai.error.InvalidRequestError):
+        return True
+    status = getattr(error, "http_status", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in (401, 429)
+
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+_IN_FLIGHT = None
+
+
+def set_max_in_flight(limit):
+    """Cap the number of LLM requests in flight across all clients of this process; None or 0 removes the cap."""
+    global _IN_FLIGHT
+    _IN_FLIGHT = threading.BoundedSemaphore(limit) if limit else None
+
+
+class _InFlightSlot:
+    def __enter__(self):
+        self.semaphore = _IN_FLIGHT
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+
+def get_client(model_name, config_dir=None):
+    """
+    Return the long-lived client for this model and configuration directory; llm_config.json is parsed only the first
+    time. Returns None when the configuration file is missing.
+    """
     if not config_dir:
         config_dir = ROOT_PATH / 'config'
-    if not os.path.exists(os.path.join(config_dir, 'llm_config.json')):
-        return "Lack of configuration file. --llm_config.json--"
+    config_path = os.path.abspath(os.path.join(config_dir, 'llm_config.json'))
+    key = (config_path, model_name)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+    if not os.path.exists(config_path):
+        return None
+    client = OPENAI_API(model_name, user_dir=config_dir)
+    with _CLIENTS_LOCK:
+        return _CLIENTS.setdefault(key, client)
+
+
+def get_model_answer(model_name, inputs_list, config_dir=None, stream=False):
+    # 代理站中一般可以访问多种OPENAI接口形式的自定义模型，非gpt模型也走同一个接口。
+    model = get_client(model_name, config_dir)
+    if model is None:
+        return MISSING_CONFIG_ANSWER
+    return model.get_response(inputs_list, stream=stream)
 
-    answer = 'no answer'
-    if 'gpt' in model_name:
-        model = OPENAI_API(model_name, user_dir=config_dir)
-        answer = model.get_response(inputs_list, stream=stream)
-    else:
-        model = OPENAI_API(model_name, user_dir=config_dir)  # 代理站中一般可以访问多种OPENAI接口形式的自定义模型，这里作为保底。
-        answer = model.get_response(inputs_list, stream=stream)
-    return answer
+
+def iter_stream_content(stream_response):
+    """Yield the text deltas of a streaming ChatCompletion response."""
+    for chunk in stream_response:
+        choices = chunk.get("choices") or []
+        if choices:
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
 
 
 class OPENAI_API:
+    """
+    Thread-safe OpenAI-compatible client. Requests are spread over all OPENAI_KEYS_BASES entries by a KeyScheduler;
+    keys and bases are passed per request instead of via openai module state.
+    """
+
     def __init__(self, model_name, user_dir):
         self.USER_DIR = Path(user_dir)
         self.CONFIG_PATH = self.USER_DIR
         # 读取LLM_CONFIG
         OPENAI_CONFIG_PATH = self.CONFIG_PATH / "llm_config.json"
-        openai_config_data = json.load(open(OPENAI_CONFIG_PATH, "r"))
-        self.keys_bases = openai_config_data["OPENAI_CONFIG"]["OPENAI_KEYS_BASES"]
-        self.current_key_index = 0  # 初始索引
-        self.api_key, self.api_base = self.keys_bases[self.current_key_index]["OPENAI_KEY"], \
-            self.keys_bases[self.current_key_index]["OPENAI_BASE"]
+        with open(OPENAI_CONFIG_PATH, "r") as f:
+            openai_config_data = json.load(f)
+        openai_config = openai_config_data["OPENAI_CONFIG"]
+        self.keys_bases = openai_config["OPENAI_KEYS_BASES"]
+        # 每个key可单独配置 OPENAI_RPM / OPENAI_TPM，未配置时使用全局值，全局也未配置则不限速
+        limits = [(key_base.get("OPENAI_RPM", openai_config.get("OPENAI_RPM")),
+                   key_base.get("OPENAI_TPM", openai_config.get("OPENAI_TPM"))) for key_base in self.keys_bases]
+        self.scheduler = KeyScheduler(limits)
 
         self.model_name = model_name
-        self.max_tokens = openai_config_data["OPENAI_CONFIG"]["OPENAI_MAX_TOKENS"]
-        self.temperature = openai_config_data["OPENAI_CONFIG"]["OPENAI_TEMPERATURE"]
+        self.max_tokens = openai_config["OPENAI_MAX_TOKENS"]
+        self.temperature = openai_config["OPENAI_TEMPERATURE"]
         self.stop = None
-        self.load_model()
-
-    def load_model(self):
-        openai.api_key = self.api_key
-        openai.base = self.api_base
 
-    def switch_api_key(self):
-        self.current_key_index = (self.current_key_index + 1) % len(self.keys_bases)
-        new_key_base = self.keys_bases[self.current_key_index]
-        self.api_key, self.api_base = new_key_base["OPENAI_KEY"], new_key_base["OPENAI_BASE"]
-        self.load_model()
-        print(f"Switched to new API key and base: {self.api_key}, {self.api_base}")
+    def key_base(self, index):
+        key_base = self.keys_bases[index]
+        # an empty base means the default OpenAI endpoint
+        return key_base["OPENAI_KEY"], key_base["OPENAI_BASE"] or None
 
     def get_response(self, inputs_list, stream=False, max_retries=3):
+        prompt_tokens = estimate_tokens("".join(str(message.get("content", "")) for message in inputs_list))
+        trace = {"model": self.model_name, "stream": stream, "attempts": 0, "key": None,
+                 "prompt_tokens": prompt_tokens, "completion_tokens": None, "ok": False}
+        start = time.perf_counter()
+        try:
+            return self._get_response(inputs_list, stream, max_retries, prompt_tokens, trace)
+        finally:
+            get_profiler().record_llm(time.perf_counter() - start, **trace)
+
+    def _get_response(self, inputs_list, stream, max_retries, prompt_tokens, trace):
         attempt = 0
         while attempt < max_retries:
+            key_index = self.scheduler.acquire(prompt_tokens)
+            api_key, api_base = self.key_base(key_index)
+            trace["attempts"] = attempt + 1
+            trace["key"] = key_index
             try:
                 if stream:
                     print("----- Streaming Request -----")
-                    stream_response = openai.ChatCompletion.create(
-                        model=self.model_name,
-                        messages=inputs_list,
-                        temperature=self.temperature,  # 对话系统需要启动随机性
-                        stream=True,
-                    )
+                    with _InFlightSlot():
+                        stream_response = openai.ChatCompletion.create(
+                            model=self.model_name,
+                            messages=inputs_list,
+                            temperature=self.temperature,  # 对话系统需要启动随机性
+                            stream=True,
+                            api_key=api_key,
+                            api_base=api_base,
+                        )
+                    self.scheduler.release(key_index, success=True)
+                    trace["ok"] = True
                     return stream_response
                 else:
-                    response = openai.ChatCompletion.create(
-                        model=self.model_name,
-                        messages=inputs_list,
-                        max_tokens=self.max_tokens,
-                        temperature=self.temperature,
-                        stop=self.stop
-                    )
+                    with _InFlightSlot():
+                        response = openai.ChatCompletion.create(
+                            model=self.model_name,
+                            messages=inputs_list,
+                            max_tokens=self.max_tokens,
+                            temperature=self.temperature,
+                            stop=self.stop,
+                            api_key=api_key,
+                            api_base=api_base,
+                        )
+                    usage = response.get("usage") or {}
+                    self.scheduler.record_tokens(key_index, usage.get("completion_tokens", 0))
+                    self.scheduler.release(key_index, success=True)
+                    trace.update(ok=True, prompt_tokens=usage.get("prompt_tokens", prompt_tokens),
+                                 completion_tokens=usage.get("completion_tokens"))
                     # print(response.choices[0].message["content"].strip())
                     return response.choices[0].message["content"].strip()
             except Exception as e:
                 attempt += 1
-                print(f"Attempt {attempt} failed with error: {e}")
-                if attempt < max_retries:
-                    wait_time = (2 ** attempt) + random.uniform(0, 1)  # Exponential backoff with jitter
-                    print(f"Waiting {wait_time:.2f} seconds before retrying...")
-                    time.sleep(wait_time)
-                    self.switch_api_key()  # Optionally switch API key before retrying
-                else:
-                    return "An error occurred, and the request could not be completed after retries."
+                if is_request_error(e):
+                    # not the key's fault: keep its circuit closed and do not send the same bad request again
+                    self.scheduler.release(key_index, success=True)
+                    print(f"Request with API key #{key_index} was rejected, not retrying: {e}")
+                    return FAILED_ANSWER
+                retry_after = None
+                if isinstance(e, openai.error.RateLimitError):
+                    headers = getattr(e, "headers", None) or {}
+                    retry_after = parse_retry_after(headers.get("Retry-After") or headers.get("retry-after"))
+                # the key is parked instead of sleeping here; the next attempt goes to whichever key is free first
+                self.scheduler.release(key_index, success=False, retry_after=retry_after)
+                print(f"Attempt {attempt} with API key #{key_index} failed with error: {e}")
+        return FAILED_ANSWER
@@ -0,0 +1,105 @@
+# Author: Lintao
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from profiler import get_profiler
+
+
+class StageFailed(Exception):
+    """Raised by StageGraph.run when a stage failed; dependents of the failed stage were not run."""
+
+    def __init__(self, name, error):
+        super().__init__(f"Stage {name} failed: {type(error).__name__}: {error}")
+        self.name = name
+        self.error = error
+
+
+class StageGraph:
+    """
+    A small DAG of pipeline stages. Each stage is a callable taking the dict of results of the stages that finished
+    before it and a threading.Event that is set when the run is interrupted, which long stages should check. A stage
+    starts in a thread pool as soon as the stages it depends on are done, so independent stages
+    overlap. A subset of the stages can be run on its own: dependencies outside the subset are assumed to be done
+    already (their outputs are on disk).
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()  # name -> (func, deps)
+
+    def add(self, name, func, deps=()):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+        self.stages[name] = (func, tuple(deps))
+        return self
+
+    def dependents(self, names):
+        """names plus every stage that depends on them, directly or not, in graph order."""
+        selected = set(names)
+        for name, (_, deps) in self.stages.items():
+            if selected.intersection(deps):
+                selected.add(name)
+        return [name for name in self.stages if name in selected]
+
+    def run(self, names=None, max_workers=None):
+        """
+        Run the stages in names (default: all of them) and return {name: result}.
+        :raise StageFailed: for the first stage that failed, after the stages already running have finished.
+        """
+        if names is None:
+            names = list(self.stages)
+        unknown = [name for name in names if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown stages: {', '.join(unknown)}; known stages: {', '.join(self.stages)}")
+        selected = [name for name in self.stages if name in set(names)]
+        waiting = {name: {dep for dep in self.stages[name][1] if dep in selected} for name in selected}
+        results, failure = OrderedDict(), None
+        lock = threading.Lock()
+        stop = threading.Event()
+        profiler = get_profiler()
+
+        def run_stage(name):
+            with lock:
+                inputs = dict(results)
+            logging.info(f"Stage {name} started")
+            with profiler.stage(name):
+                return self.stages[name][0](inputs, stop)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers or max(len(selected), 1), thread_name_prefix="stage")
+        try:
+            running = {}
+            while waiting or running:
+                if failure is None:
+                    for name in [name for name, deps in waiting.items() if not deps]:
+                        del waiting[name]
+                        running[executor.submit(run_stage, name)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logging.error(f"Stage {name} failed: {e}")
+                        failure = failure or StageFailed(name, e)
+                        continue
+                    logging.info(f"Stage {name} finished")
+                    with lock:
+                        results[name] = result
+                    for deps in waiting.values():
+                        deps.discard(name)
+        except BaseException:
+            # e.g. Ctrl-C: do not start further stages, and tell the running ones to stop sending requests
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        if failure is not None:
+            skipped = list(waiting)
+            if skipped:
+                logging.warning(f"Skipped stages after the failure of {failure.name}: {', '.join(skipped)}")
+            raise failure
+        return results
@@ -0,0 +1,141 @@
+# Author: Lintao
+import contextlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+class Profiler:
+    """
+    Collects timing events for pipeline stages and LLM requests plus named counters (e.g. bytes read), and writes them
+    as a JSON trace. Safe to use from several threads; LLM requests are attributed to the innermost stage of the thread
+    that made them.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.events = []
+        self.counters = OrderedDict()
+
+    def current_stage(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stack.pop()
+            self._add({"type": "stage", "name": name, "parent": stack[-1] if stack else None,
+                       "start": round(start - self._origin, 6), "seconds": round(time.perf_counter() - start, 6),
+                       "thread": threading.current_thread().name, **fields})
+
+    def record_llm(self, seconds, **fields):
+        self._add({"type": "llm", "stage": self.current_stage(), "seconds": round(seconds, 6),
+                   "thread": threading.current_thread().name, **fields})
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _add(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        with self._lock:
+            events = list(self.events)
+            counters = OrderedDict(self.counters)
+        stages = OrderedDict()
+        for event in events:
+            if event["type"] != "stage":
+                continue
+            row = stages.setdefault(event["name"], {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            row["count"] += 1
+            row["seconds"] += event["seconds"]
+            row["max_seconds"] = max(row["max_seconds"], event["seconds"])
+        llm = OrderedDict()
+        for event in events:
+            if event["type"] != "llm":
+                continue
+            row = llm.setdefault(event.get("stage") or "-", {"requests": 0, "seconds": 0.0, "retries": 0,
+                                                              "prompt_tokens": 0, "completion_tokens": 0, "failed": 0})
+            row["requests"] += 1
+            row["seconds"] += event["seconds"]
+            row["retries"] += max(event.get("attempts", 1) - 1, 0)
+            row["prompt_tokens"] += event.get("prompt_tokens") or 0
+            row["completion_tokens"] += event.get("completion_tokens") or 0
+            row["failed"] += 0 if event.get("ok", True) else 1
+        keys = OrderedDict()
+        for event in events:
+            if event["type"] == "llm" and event.get("key") is not None:
+                keys[str(event["key"])] = keys.get(str(event["key"]), 0) + 1
+        return {"wall_seconds": round(time.perf_counter() - self._origin, 6), "stages": stages, "llm": llm,
+                "requests_per_key": keys, "counters": counters}
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [f"Total wall time: {summary['wall_seconds']:.2f}s", "",
+                 f"{'stage':<32} {'count':>6} {'total s':>10} {'max s':>10}"]
+        for name, row in summary["stages"].items():
+            lines.append(f"{name:<32} {row['count']:>6} {row['seconds']:>10.3f} {row['max_seconds']:>10.3f}")
+        if summary["llm"]:
+            lines += ["", f"{'LLM requests by stage':<32} {'count':>6} {'total s':>10} {'retries':>8} "
+                          f"{'prompt tok':>11} {'output tok':>11} {'failed':>7}"]
+            for name, row in summary["llm"].items():
+                lines.append(f"{name:<32} {row['requests']:>6} {row['seconds']:>10.3f} {row['retries']:>8} "
+                             f"{row['prompt_tokens']:>11} {row['completion_tokens']:>11} {row['failed']:>7}")
+        if summary["requests_per_key"]:
+            lines += ["", "Requests per API key: " +
+                      ", ".join(f"#{key}: {count}" for key, count in summary["requests_per_key"].items())]
+        for name, value in summary["counters"].items():
+            lines.append(f"{name}: {round(value, 6) if isinstance(value, float) else value}")
+        return "\n".join(lines)
+
+    def save(self, path):
+        with self._lock:
+            events = list(self.events)
+        trace = {"started": self.started, "summary": self.summary(), "events": events}
+        with open(path, "w", encoding='utf-8') as f:
+            json.dump(trace, f, ensure_ascii=False, indent=2)
+        logging.info(f"Profile trace has been saved to {path}")
+
+
+class NullProfiler:
+    """Stands in when profiling is off, so instrumented code does not need to check."""
+
+    def current_stage(self):
+        return None
+
+    def stage(self, name, **fields):
+        return contextlib.nullcontext()
+
+    def record_llm(self, seconds, **fields):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+
+_NULL_PROFILER = NullProfiler()
+_ACTIVE = None
+
+
+def set_profiler(profiler):
+    global _ACTIVE
+    _ACTIVE = profiler
+
+
+def get_profiler():
+    return _ACTIVE if _ACTIVE is not None else _NULL_PROFILER
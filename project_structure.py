@@ -0,0 +1,135 @@
+# Author: Lintao
+import contextlib
+import heapq
+import logging
+import os
+import uuid
+
+
+def scandir_listing(dir_path, is_ignored=None):
+    """Yield (name, is_dir) for the entries of dir_path in directory order, skipping ignored ones."""
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_ignored is not None and is_ignored(entry.path, is_dir):
+                    continue
+                yield entry.name, is_dir
+    except OSError as e:
+        logging.warning(f"Cannot list {dir_path}: {e}")
+
+
+class _ListingStats:
+    """Counts a listing while it is consumed and notes whether it only holds files with one extension."""
+
+    def __init__(self, listing):
+        self._listing = listing
+        self.count = 0
+        self.extension = None
+        self.homogeneous = True
+
+    def __iter__(self):
+        for name, is_dir in self._listing:
+            self.count += 1
+            if self.homogeneous:
+                extension = os.path.splitext(name)[1]
+                if is_dir or (self.extension is not None and extension != self.extension):
+                    self.homogeneous = False
+                self.extension = extension
+            yield name, is_dir
+
+
+def _directory_entries(dir_path, list_dir, max_entries, collapse_threshold):
+    """
+    The sorted entries of one directory, at most max_entries of them, plus the number left out and, for a large
+    directory holding only files of one extension, a one-line summary instead of the entries.
+    """
+    stats = _ListingStats(list_dir(dir_path))
+    if max_entries:
+        # keeps only max_entries names in memory however large the directory is
+        entries = heapq.nsmallest(max_entries, stats, key=lambda entry: entry[0])
+    else:
+        entries = sorted(stats, key=lambda entry: entry[0])
+    if collapse_threshold and stats.count > collapse_threshold and stats.homogeneous:
+        return [], 0, f"{stats.count} *{stats.extension or ''} files"
+    return entries, stats.count - len(entries), None
+
+
+def iter_structure_lines(root_dir, list_dir=None, max_depth=None, max_entries=None, collapse_threshold=None,
+                         indent_level=0):
+    """
+    Yield the markdown lines of the project structure, depth first, without recursion and without holding more than
+    one listing per open directory level.
+    :param list_dir: callable dir_path -> iterable of (name, is_dir); defaults to an unfiltered os.scandir listing.
+    :param max_depth: deepest level listed (0 = only the entries of root_dir); deeper directories are not opened.
+    :param max_entries: entries listed per directory; the rest is summarized as "... N more".
+    :param collapse_threshold: directories with more entries than this that only hold files of one extension are
+        summarized in one line.
+    """
+    if list_dir is None:
+        list_dir = scandir_listing
+    stack = []
+
+    def open_directory(dir_path, depth):
+        entries, more, collapsed = _directory_entries(dir_path, list_dir, max_entries, collapse_threshold)
+        stack.append((iter(entries), dir_path, depth, more, collapsed))
+
+    open_directory(root_dir, indent_level)
+    while stack:
+        entries, dir_path, depth, more, collapsed = stack[-1]
+        prefix = '  ' * depth
+        if collapsed is not None:
+            stack.pop()
+            yield f"{prefix}- ... {collapsed}"
+            continue
+        item = next(entries, None)
+        if item is None:
+            stack.pop()
+            if more:
+                yield f"{prefix}- ... {more} more"
+            continue
+        name, is_dir = item
+        if not is_dir:
+            yield f"{prefix}- {name}"
+            continue
+        yield f"{prefix}- **{name}/**"
+        if max_depth is None or depth - indent_level < max_depth:
+            open_directory(os.path.join(dir_path, name), depth + 1)
+
+
+@contextlib.contextmanager
+def atomic_write(file_path, partial_path=None):
+    """
+    Yield a text file opened next to file_path and rename it over file_path when the block finishes, so readers never
+    see a half-written file. The file is created like a plain open() would, with the mode the umask allows. If the
+    block fails, what was written is moved to partial_path, or removed when there is none.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "x", encoding='utf-8') as f:
+            yield f
+    except BaseException:
+        if partial_path:
+            os.replace(tmp_path, partial_path)
+        else:
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, file_path)
+
+
+def write_structure(lines, file_path, header=None):
+    """Stream lines to file_path through a temporary file. :return: the number of lines written."""
+    count = 0
+    with atomic_write(file_path) as f:
+        if header:
+            f.write(header)
+        for line in lines:
+            if count:
+                f.write("\n")
+            f.write(line)
+            count += 1
+    return count
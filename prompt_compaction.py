@@ -0,0 +1,59 @@
+# Author: Lintao
+import os
+from collections import OrderedDict
+
+
+def collapse_structure(structure, max_depth, indent="  "):
+    """
+    Drop the entries of a PROJECT_STRUCTURE.md listing that are nested deeper than max_depth (0 = top level only) and
+    leave a "... N more entries" line under the last directory that is kept.
+    """
+    lines = []
+    hidden = 0
+    hidden_level = 0
+
+    def flush():
+        if hidden:
+            lines.append(f"{indent * hidden_level}- ... {hidden} more entries")
+
+    for line in structure.splitlines():
+        stripped = line.lstrip(' ')
+        level = (len(line) - len(stripped)) // len(indent)
+        if level > max_depth:
+            if not hidden:
+                hidden_level = max_depth + 1
+            hidden += 1
+            continue
+        flush()
+        hidden = 0
+        lines.append(line)
+    flush()
+    return "\n".join(lines)
+
+
+def group_by_directory(descriptions, project_dir):
+    """Group {path: description} by the directory of each path relative to project_dir ('.' for the top level)."""
+    groups = OrderedDict()
+    for path, description in descriptions.items():
+        relative_dir = os.path.dirname(os.path.relpath(path, project_dir)).replace(os.sep, "/")
+        groups.setdefault(relative_dir or ".", OrderedDict())[os.path.relpath(path, project_dir)] = description
+    return groups
+
+
+def group_by_top_level(directory_summaries):
+    """Group {relative directory: summary} by the first component of the directory."""
+    groups = OrderedDict()
+    for directory, summary in directory_summaries.items():
+        groups.setdefault(directory.split("/")[0], OrderedDict())[directory] = summary
+    return groups
+
+
+def format_entries(entries):
+    return "\n\n".join(f"{name}:\n{text}" for name, text in entries.items())
+
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 20)].rstrip() + "\n... (truncated)"
@@ -0,0 +1,110 @@
+# Author: Lintao
+import ast
+import importlib.metadata
+import importlib.util
+import logging
+import os
+import re
+import sys
+import sysconfig
+
+_IMPORT_LINE = re.compile(r'^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w.,\s]+))')
+
+
+def _stdlib_module_names():
+    names = getattr(sys, "stdlib_module_names", None)
+    if names is not None:
+        return frozenset(names)
+    return frozenset(sys.builtin_module_names)
+
+
+STDLIB_MODULES = _stdlib_module_names()
+_STDLIB_DIR = os.path.normcase(os.path.realpath(sysconfig.get_paths()["stdlib"]))
+
+
+def is_stdlib_module(name):
+    if name in STDLIB_MODULES:
+        return True
+    if hasattr(sys, "stdlib_module_names"):
+        return False
+    # Python < 3.10: fall back to where the module lives
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return False
+    if spec is None or not spec.origin or spec.origin in ("built-in", "frozen"):
+        return spec is not None
+    origin = os.path.normcase(os.path.realpath(spec.origin))
+    return origin.startswith(_STDLIB_DIR) and "site-packages" not in origin
+
+
+def find_imported_modules(content, filename="<unknown>"):
+    """
+    Top-level names of all absolute imports in a piece of Python code, including indented, conditional and
+    multi-line imports. Code that does not parse (e.g. Python 2) falls back to a line scan.
+    """
+    modules = set()
+    try:
+        tree = ast.parse(content, filename=filename)
+    except (SyntaxError, ValueError) as e:
+        logging.debug(f"Cannot parse {filename}, scanning import lines instead: {e}")
+        for line in content.splitlines():
+            m = _IMPORT_LINE.match(line)
+            if not m:
+                continue
+            if m.group(1):
+                if not m.group(1).startswith('.'):
+                    modules.add(m.group(1).split('.')[0])
+            else:
+                for part in m.group(2).split(','):
+                    name = part.strip().split(' ')[0].split('.')[0]
+                    if name.isidentifier():
+                        modules.add(name)
+        return modules
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                modules.add(alias.name.split('.')[0])
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split('.')[0])
+    return modules
+
+
+def find_local_modules(project_dir, file_paths):
+    """Names that resolve to the project itself: every module file and every directory that holds Python code."""
+    local = set()
+    for path in file_paths:
+        if not path.endswith(".py"):
+            continue
+        parts = os.path.relpath(path, project_dir).split(os.sep)
+        local.update(parts[:-1])
+        name = os.path.splitext(parts[-1])[0]
+        if name != "__init__":
+            local.add(name)
+    return local
+
+
+def resolve_requirements(module_names):
+    """
+    Map import names to installed distributions.
+    :return: (sorted list of "distribution==version", sorted list of names that could not be resolved)
+    """
+    packages_distributions = getattr(importlib.metadata, "packages_distributions", None)
+    if packages_distributions is None:
+        # Python < 3.10 has no import name index: leave every name to the caller's fallback
+        logging.info("importlib.metadata.packages_distributions is not available, no requirement resolved offline")
+        return [], sorted(module_names)
+    packages = packages_distributions()
+    requirements = set()
+    unresolved = []
+    for name in sorted(module_names):
+        distributions = packages.get(name)
+        if not distributions:
+            unresolved.append(name)
+            continue
+        for distribution in distributions:
+            try:
+                requirements.add(f"{distribution}=={importlib.metadata.version(distribution)}")
+            except importlib.metadata.PackageNotFoundError:
+                requirements.add(distribution)
+    return sorted(requirements, key=str.lower), unresolved
@@ -0,0 +1,160 @@
+# Author: Lintao
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from file_inventory import file_digest
+
+
+class ReadmeWatcher:
+    """
+    Keeps the outputs of an AutoReadme run current while the project changes. The project is polled with the shared
+    file inventory; a file counts as changed when its mtime or size moved and its content hash differs. After changes
+    settle for `debounce` seconds, only the affected entries of SCRIPT_DESCRIPTION.json are regenerated, the structure
+    is re-rendered from the inventory when files were added or removed, requirements are resolved again when the set
+    of third-party imports changed, and the README is generated once for the whole batch of changes.
+    """
+
+    def __init__(self, auto_readme, interval=2.0, debounce=5.0, regenerate_readme=True, stream=False):
+        self.auto_readme = auto_readme
+        self.interval = interval
+        self.debounce = debounce
+        self.regenerate_readme = regenerate_readme
+        self.stream = stream
+        self._excluded = [os.path.join(os.path.abspath(auto_readme.out_put_dir), ''),
+                          os.path.abspath(auto_readme.readme_path)]
+        self._snapshot = {}  # path -> (mtime_ns, size, content hash of scripts or None)
+        self._third_party = None
+
+    def _is_excluded(self, path):
+        path = os.path.abspath(path)
+        return path == self._excluded[1] or path.startswith(self._excluded[0])
+
+    def take_snapshot(self, previous=None):
+        """Stat every file of a fresh inventory; scripts are hashed only when their stat changed."""
+        previous = previous or {}
+        inventory = self.auto_readme.get_inventory(refresh=True)
+        scripts = set(self.auto_readme.find_all_scripts_and_config_files())
+        snapshot = {}
+        for path in inventory.files:
+            if self._is_excluded(path):
+                continue
+            stat = inventory.stat(path)
+            key = (stat.st_mtime_ns, stat.st_size)
+            old = previous.get(path)
+            if path not in scripts:
+                snapshot[path] = key + (None,)
+            elif old is not None and old[:2] == key and old[2] is not None:
+                snapshot[path] = old
+            else:
+                snapshot[path] = key + (file_digest(path),)
+        return snapshot
+
+    @staticmethod
+    def diff(old, new):
+        added = [path for path in new if path not in old]
+        removed = [path for path in old if path not in new]
+        changed = [path for path in new if path in old and new[path] != old[path]
+                   and (new[path][2] is None or new[path][2] != old[path][2])]
+        return added, changed, removed
+
+    def start(self):
+        self._snapshot = self.take_snapshot()
+        self._third_party = self.auto_readme.find_third_party_modules()
+
+    def apply_changes(self, added, changed, removed):
+        """Regenerate only the outputs whose inputs changed; the README only when one of its inputs was rewritten."""
+        auto_readme = self.auto_readme
+        scripts = auto_readme.find_all_scripts_and_config_files()
+        script_set = set(scripts)
+        touched = [path for path in added + changed if path in script_set]
+        logging.info(f"Changes: {len(added)} added, {len(changed)} changed, {len(removed)} removed; "
+                     f"describing {len(touched)} scripts")
+
+        structure_changed = bool(added or removed)
+        if structure_changed:
+            auto_readme.save_project_structure()
+
+        requirements_changed = False
+        if any(path.endswith(".py") for path in added + changed + removed):
+            third_party = auto_readme.find_third_party_modules()
+            if third_party != self._third_party:
+                self._third_party = third_party
+                auto_readme.save_project_requirements(auto_readme.generate_project_requirements(third_party))
+                requirements_changed = True
+
+        descriptions_changed = self._update_descriptions(scripts, touched, removed)
+
+        if not (structure_changed or requirements_changed or descriptions_changed):
+            logging.info("No README input changed, nothing to regenerate")
+            return
+        if self.regenerate_readme:
+            auto_readme.generate_readme(stream=self.stream)
+
+    def _update_descriptions(self, scripts, touched, removed):
+        """Describe the touched scripts and drop removed ones. :return: whether SCRIPT_DESCRIPTION.json was rewritten."""
+        auto_readme = self.auto_readme
+        if not touched and not removed:
+            return False
+        descriptions = auto_readme.load_script_descriptions()
+        if not touched and not any(path in descriptions or path in auto_readme.description_failures
+                                   for path in removed):
+            return False
+        script_set = set(scripts)
+        failures = {path: error for path, error in auto_readme.description_failures.items() if path in script_set}
+        described = OrderedDict()
+        for path, (description, error) in zip(touched, auto_readme._map(auto_readme._describe_script, touched)):
+            failures.pop(path, None)
+            if error is not None:
+                failures[path] = error
+                descriptions.pop(path, None)
+            else:
+                descriptions[path] = description
+                described[path] = description
+        auto_readme.description_failures = failures
+        # a later --resume run then knows these files are done
+        auto_readme.record_descriptions(described)
+        # keep the order of a full run
+        ordered = OrderedDict((path, descriptions[path]) for path in scripts if path in descriptions)
+        auto_readme.save_script_descriptions(ordered)
+        return True
+
+    def poll(self):
+        """:return: (added, changed, removed) since the last poll."""
+        snapshot = self.take_snapshot(self._snapshot)
+        changes = self.diff(self._snapshot, snapshot)
+        self._snapshot = snapshot
+        return changes
+
+    def run(self, max_iterations=None):
+        logging.info(f"Watching {self.auto_readme.project_dir} every {self.interval}s, debounce {self.debounce}s")
+        self.start()
+        pending = (set(), set(), set())
+        last_change = None
+        iterations = 0
+        try:
+            while max_iterations is None or iterations < max_iterations:
+                iterations += 1
+                time.sleep(self.interval)
+                added, changed, removed = self.poll()
+                if added or changed or removed:
+                    pending[0].update(added)
+                    pending[1].update(changed)
+                    pending[2].update(removed)
+                    last_change = time.monotonic()
+                    continue
+                if last_change is None or time.monotonic() - last_change < self.debounce:
+                    continue
+                # a file added and removed again within the window is dropped; one removed and re-added is changed
+                added_set = pending[0] - pending[2]
+                removed_set = pending[2] - pending[0]
+                changed_set = (pending[1] | (pending[0] & pending[2])) - removed_set
+                changed_set = {path for path in changed_set if path in self._snapshot}
+                added_set = {path for path in added_set if path in self._snapshot}
+                pending = (set(), set(), set())
+                last_change = None
+                if added_set or changed_set or removed_set:
+                    self.apply_changes(sorted(added_set), sorted(changed_set), sorted(removed_set))
+        except KeyboardInterrupt:
+            logging.info("Stopped watching")